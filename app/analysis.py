@@ -0,0 +1,142 @@
+from collections import Counter
+
+import pandas as pd
+
+# analysis_store also puts the Streamlit dashboard's directory on sys.path for the shared helpers below
+from analysis_store import content_hash, save_analysis, load_analysis
+from ingest import iter_row_batches, read_table, count_rows
+from nlp_models import get_nlp, disabled_components, ENTITY_COMPONENTS, RELATIONSHIP_COMPONENTS
+from instrumentation import stage
+
+# Entities plus the dependency parse; the lemmatizer is never loaded
+ANALYSIS_COMPONENTS = ENTITY_COMPONENTS + RELATIONSHIP_COMPONENTS
+
+# Parse uploads cell by cell (in windows of at most CHUNK_SIZE characters) instead of as one joined Doc
+CHUNK_SIZE = 100000
+NLP_BATCH_SIZE = 64
+
+def get_pipeline():
+    """Return the shared SpaCy pipeline (loaded on first use) and the components to disable."""
+    nlp = get_nlp(components=ANALYSIS_COMPONENTS)
+    return nlp, disabled_components(nlp, ANALYSIS_COMPONENTS)
+
+def analyze_text(text):
+    nlp, disable = get_pipeline()
+    return analyze_doc(nlp(text, disable=disable))
+
+def new_analysis():
+    return {'entities': [], 'relationships': [], 'entity_counts': Counter(), 'relationship_counts': Counter()}
+
+def add_doc(analysis, doc, row=None, column=None, offset=0):
+    """
+    Merge the entities and dependency relations of one parsed Doc into an analysis.
+
+    When the Doc was parsed from a single cell, row/column identify the source cell and
+    offset is the Doc's position inside that cell, so entity offsets point back into it.
+    """
+    location = {} if row is None else {'row': row, 'column': column}
+
+    for ent in doc.ents:
+        entity = {'text': ent.text, 'label': ent.label_, **location}
+        if row is not None:
+            entity['start'] = offset + ent.start_char
+            entity['end'] = offset + ent.end_char
+        analysis['entities'].append(entity)
+        analysis['entity_counts'][ent.label_] += 1
+
+    # Extract relationships (e.g., subject-action-object)
+    for token in doc:
+        if token.dep_ in ('nsubj', 'dobj'):
+            analysis['relationships'].append({'subject': token.head.text, 'action': token.dep_, 'object': token.text, **location})
+            analysis['relationship_counts'][f"{token.head.text} -> {token.dep_} -> {token.text}"] += 1
+
+def finalize_analysis(analysis):
+    analysis['entity_counts'] = dict(analysis['entity_counts'])
+    analysis['relationship_counts'] = dict(analysis['relationship_counts'])
+    return analysis
+
+def analyze_doc(doc):
+    """Extract entities, dependency relations and their counts from a parsed Doc."""
+    analysis = new_analysis()
+    add_doc(analysis, doc)
+    return finalize_analysis(analysis)
+
+def split_into_windows(text, max_chars=CHUNK_SIZE):
+    """Yield (offset, window) pairs covering text, breaking at sentence ends where possible."""
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            boundary = max(text.rfind('. ', start, end), text.rfind('\n', start, end))
+            if boundary > start:
+                end = boundary + 1
+        yield start, text[start:end]
+        start = end
+
+def iter_cells(batches):
+    """Yield (window, (row, column, offset)) for every non-empty cell of each row batch, one window at a time."""
+    for df in batches:
+        yield from _iter_batch_cells(df)
+
+def _iter_batch_cells(df):
+    for index, values in zip(df.index, df.itertuples(index=False, name=None)):
+        row = index + 2  # Excel row 1 is header
+        for column, value in zip(df.columns, values):
+            if pd.isna(value):
+                continue
+            for offset, window in split_into_windows(str(value)):
+                yield window, (row, str(column), offset)
+
+def analyze_rows(batches, progress=None):
+    """
+    Stream cells from row batches through the pipeline and merge their results incrementally.
+
+    progress, when given, is called with the number of rows fully processed so far.
+    """
+    nlp, disable = get_pipeline()
+    analysis = new_analysis()
+    current_row = None
+    cells = iter_cells(batches)
+    for doc, (row, column, offset) in nlp.pipe(cells, as_tuples=True, batch_size=NLP_BATCH_SIZE, disable=disable):
+        if progress is not None and row != current_row:
+            progress(row - 2)
+            current_row = row
+        add_doc(analysis, doc, row, column, offset)
+    return finalize_analysis(analysis)
+
+def process_file(file_path, analysis_folder, chunked=True, progress=None):
+    """
+    Analyze an uploaded file and persist the result, reusing it for identical uploads.
+
+    Returns:
+    - (doc_id, analysis)
+    """
+    with stage('hash'):
+        doc_id = content_hash(file_path)
+    analysis = load_analysis(analysis_folder, doc_id)
+    if analysis is not None:
+        return doc_id, analysis
+
+    if chunked:
+        # Stream row batches and parse cell by cell, so parsing starts before the
+        # whole file is read and memory does not grow with the size of one joined Doc
+        analysis = analyze_rows(iter_row_batches(file_path), progress)
+    else:
+        # Read the file into a DataFrame and combine all rows into a single text string
+        df = read_table(file_path)
+        text = ' '.join(df.astype(str).fillna('').apply(lambda x: ' '.join(x), axis=1))
+        nlp, _ = get_pipeline()
+        nlp.max_length = max(len(text), 1500000)  # Adjust SpaCy max_length to avoid exceeding limits
+        analysis = analyze_text(text)
+
+    # Persist the result for /insights and /network-data
+    with stage('save'):
+        save_analysis(analysis_folder, doc_id, analysis)
+    return doc_id, analysis
+
+def estimate_rows(file_path):
+    """Best-effort row count used for progress reporting, or None if unknown."""
+    try:
+        return count_rows(file_path)
+    except Exception:
+        return None
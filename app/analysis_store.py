@@ -0,0 +1,47 @@
+import json
+import os
+import re
+import sys
+
+# Share the ingestion helpers that live alongside the Streamlit dashboard
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit_app'))
+from ingest import content_hash
+from lru import LRUCache
+
+# Analysis results are keyed by the SHA-256 of the uploaded file's bytes
+DOC_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# In-process cache so repeated requests for the same upload skip the disk read
+MAX_CACHED_ANALYSES = 8
+_cache = LRUCache(MAX_CACHED_ANALYSES)
+
+def is_valid_doc_id(doc_id):
+    return isinstance(doc_id, str) and bool(DOC_ID_PATTERN.match(doc_id))
+
+def _analysis_path(store_dir, doc_id):
+    return os.path.join(store_dir, f"{doc_id}.json")
+
+def save_analysis(store_dir, doc_id, analysis):
+    """Persist an analysis result, writing to a temp file first so readers never see a partial file."""
+    os.makedirs(store_dir, exist_ok=True)
+    path = _analysis_path(store_dir, doc_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(analysis, f)
+    os.replace(tmp_path, path)
+    _cache.put(doc_id, analysis)
+
+def load_analysis(store_dir, doc_id):
+    """Return the stored analysis for doc_id, or None if it has not been computed."""
+    if not is_valid_doc_id(doc_id):
+        return None
+    analysis = _cache.get(doc_id)
+    if analysis is not None:
+        return analysis
+    path = _analysis_path(store_dir, doc_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        analysis = json.load(f)
+    _cache.put(doc_id, analysis)
+    return analysis
@@ -1,17 +1,56 @@
-from flask import Flask, request, jsonify, render_template
-import pandas as pd
-import spacy
+from flask import Flask, request, jsonify, render_template, g, Response, stream_with_context
 import os
+import time
+import uuid
 from collections import Counter
+from analysis_store import load_analysis
+from analysis import analyze_text, ANALYSIS_COMPONENTS
+from ingest import detect_format
+from jobs import JobQueue
+from relationship_graph import get_graph, METRICS
+from compact import (encode_entities, encode_relationships, select, page_bounds, ndjson_lines, gzip_stream,
+                     compress_response, DEFAULT_PAGE_SIZE)
+from nlp_models import preload, load_metrics
+from instrumentation import record, prometheus_text
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
-nlp = spacy.load("en_core_web_sm")  # Load SpaCy's pre-trained model
 
 # Configure upload folder
 UPLOAD_FOLDER = './uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['ANALYSIS_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'analysis')
+
+# Parse uploads cell by cell instead of as one joined Doc
+app.config['CHUNKED_PROCESSING'] = True
+
+# Load the SpaCy model once before any workers fork, so gunicorn --preload workers share it
+# copy-on-write, and have job pool workers load it as they start. Set PRELOAD_NLP=0 to load
+# lazily on first use.
+PRELOAD_NLP = os.environ.get('PRELOAD_NLP', '1') == '1'
+if PRELOAD_NLP:
+    preload(components=ANALYSIS_COMPONENTS)
+
+# Uploads are analyzed by a pool of worker processes, one job per upload
+job_queue = JobQueue(os.path.join(UPLOAD_FOLDER, 'jobs.sqlite3'),
+                     preload_components=ANALYSIS_COMPONENTS if PRELOAD_NLP else None)
+
+# Time every request; each endpoint is reported as its own stage on /metrics
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    if request.endpoint not in (None, 'static', 'metrics'):
+        record(f"http_{request.endpoint}", time.perf_counter() - g.request_started)
+    return response
+
+# Compress JSON responses with brotli (when installed) or gzip, as the client accepts
+@app.after_request
+def compress(response):
+    return compress_response(response, request.headers.get('Accept-Encoding'))
 
 @app.route('/')
 def index():
@@ -26,59 +65,117 @@ def upload_file():
         return jsonify({'error': 'No file selected'}), 400
     if file:
         try:
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
+            detect_format(file.filename)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        try:
+            # Save under a random ID (keeping only the extension, which the reader needs), so
+            # concurrent uploads with the same name never overwrite each other
+            file_path = os.path.join(app.config['UPLOAD_FOLDER'], uuid.uuid4().hex + os.path.splitext(file.filename)[1].lower())
             file.save(file_path)
-            return process_excel(file_path)
+            job_id = job_queue.submit(file.filename, file_path, app.config['ANALYSIS_FOLDER'], app.config['CHUNKED_PROCESSING'])
+            return jsonify({'job_id': job_id, 'status': 'queued'}), 202
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
-def process_excel(file_path):
-    try:
-        # Read the Excel file into a DataFrame
-        df = pd.read_excel(file_path)
-        
-        # Combine all rows into a single text string
-        text = ' '.join(df.astype(str).fillna('').apply(lambda x: ' '.join(x), axis=1))
-        nlp.max_length = max(len(text), 1500000)  # Adjust SpaCy max_length to avoid exceeding limits
-
-        # Perform NLP processing
-        doc = nlp(text)
-
-        # Extract entities
-        entities = [{'text': ent.text, 'label': ent.label_} for ent in doc.ents]
-
-        # Extract relationships (e.g., subject-action-object)
-        relationships = [
-            {'subject': token.head.text, 'action': token.dep_, 'object': token.text}
-            for token in doc
-            if token.dep_ in ('nsubj', 'dobj')
-        ]
-
-        return jsonify({'entities': entities, 'relationships': relationships, 'text': text})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    job.pop('file_path')
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error']}), 500
+    if job['status'] != 'done':
+        return jsonify({'error': 'Job has not finished', 'status': job['status']}), 409
+
+    # Strings are dictionary-encoded; see compact.encode_entities and encode_relationships
+    analysis = load_analysis(app.config['ANALYSIS_FOLDER'], job['doc_id'])
+    return jsonify({
+        'doc_id': job['doc_id'],
+        'entities': encode_entities(analysis['entities']),
+        'relationships': encode_relationships(analysis['relationships']),
+    })
+
+def list_records(kind, key, encode):
+    """
+    One page of a stored analysis' entities or relationships, filtered by key.
+
+    Query parameters: doc_id, any number of key values to keep (e.g. ?label=ORG&label=GPE),
+    page and page_size. With format=ndjson every matching record is streamed instead,
+    one JSON object per line.
+    """
+    doc_id = request.args.get('doc_id')
+    analysis = load_analysis(app.config['ANALYSIS_FOLDER'], doc_id)
+    if analysis is None:
+        return jsonify({'error': f'Unknown doc_id: {doc_id}'}), 404
+
+    records = analysis[kind]
+    positions, values = select(doc_id, analysis, kind, key, request.args.getlist(key))
+
+    if request.args.get('format') == 'ndjson':
+        lines = ndjson_lines(records[position] for position in positions)
+        response = Response(stream_with_context(lines), mimetype='application/x-ndjson')
+        if 'gzip' in (request.headers.get('Accept-Encoding') or ''):
+            response.response = gzip_stream(response.response)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.vary.add('Accept-Encoding')
+        return response
+
+    page = request.args.get('page', 1, type=int)
+    start, end, page_size = page_bounds(page, request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int), len(positions))
+    return jsonify({
+        'doc_id': doc_id,
+        'total': len(positions),
+        'page': page,
+        'page_size': page_size,
+        f'all_{key}s': values,
+        **encode([records[position] for position in positions[start:end]]),
+    })
+
+@app.route('/entities', methods=['GET'])
+def entities():
+    return list_records('entities', 'label', encode_entities)
+
+@app.route('/relationships', methods=['GET'])
+def relationships():
+    return list_records('relationships', 'action', encode_relationships)
+
+def get_request_analysis():
+    """Resolve the analysis for a request by 'doc_id', falling back to parsing raw 'text'."""
+    payload = request.get_json(silent=True) or {}
+    doc_id = payload.get('doc_id')
+    if doc_id:
+        analysis = load_analysis(app.config['ANALYSIS_FOLDER'], doc_id)
+        if analysis is None:
+            return None, (jsonify({'error': f'Unknown doc_id: {doc_id}'}), 404)
+        return analysis, None
+
+    text = payload.get('text', '')
+    if not text:
+        return None, (jsonify({'error': 'No doc_id or text provided'}), 400)
+    return analyze_text(text), None
 
 @app.route('/insights', methods=['POST'])
 def generate_insights():
     try:
-        # Extract the text sent by the frontend
-        text = request.json.get('text', '')
-        if not text:
-            return jsonify({'error': 'No text provided for insights'}), 400
-
-        doc = nlp(text)
+        analysis, error = get_request_analysis()
+        if error:
+            return error
 
         # Count entity types
-        entity_counter = Counter([ent.label_ for ent in doc.ents])
+        entity_counter = Counter(analysis['entity_counts'])
         most_frequent_entity = entity_counter.most_common(1)[0] if entity_counter else ("None", 0)
 
         # Summarize relationships
-        relationships = [
-            {'subject': token.head.text, 'action': token.dep_, 'object': token.text}
-            for token in doc
-            if token.dep_ in ('nsubj', 'dobj')
-        ]
-        relationship_summary = Counter([f"{rel['subject']} -> {rel['action']} -> {rel['object']}" for rel in relationships])
+        relationship_summary = Counter(analysis['relationship_counts'])
 
         # Prepare insights
         insights = {
@@ -94,29 +191,71 @@ def generate_insights():
 @app.route('/network-data', methods=['POST'])
 def network_data():
     try:
-        text = request.json.get('text', '')
-        if not text:
-            return jsonify({'error': 'No text provided for network data'}), 400
-
-        doc = nlp(text)
+        analysis, error = get_request_analysis()
+        if error:
+            return error
 
         # Generate nodes and edges for network visualization
         nodes = []
         edges = []
         entity_set = set()
 
-        for ent in doc.ents:
-            if ent.text not in entity_set:
-                nodes.append({'id': ent.text, 'label': ent.text, 'group': ent.label_})
-                entity_set.add(ent.text)
+        for entity in analysis['entities']:
+            if entity['text'] not in entity_set:
+                nodes.append({'id': entity['text'], 'label': entity['text'], 'group': entity['label']})
+                entity_set.add(entity['text'])
 
-        for token in doc:
-            if token.dep_ in ('nsubj', 'dobj'):
-                edges.append({'from': token.head.text, 'to': token.text, 'label': token.dep_})
+        for rel in analysis['relationships']:
+            edges.append({'from': rel['subject'], 'to': rel['object'], 'label': rel['action']})
 
         return jsonify({'nodes': nodes, 'edges': edges})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/graph', methods=['POST'])
+def graph_data():
+    """
+    Deduplicated, weighted relationship graph with per-node metrics, filtered server-side.
+
+    Besides 'doc_id' or 'text', the payload may filter with 'labels', 'actions',
+    'min_weight', 'node' and 'top' (ranked by 'rank_by', PageRank by default).
+    """
+    try:
+        analysis, error = get_request_analysis()
+        if error:
+            return error
+
+        payload = request.get_json(silent=True) or {}
+        rank_by = payload.get('rank_by', 'pagerank')
+        if rank_by not in METRICS:
+            return jsonify({'error': f'rank_by must be one of {", ".join(METRICS)}'}), 400
+        top = payload.get('top')
+        for name in ('labels', 'actions'):
+            if payload.get(name) is not None and not isinstance(payload[name], list):
+                return jsonify({'error': f'{name} must be a list'}), 400
+
+        graph = get_graph(analysis, payload.get('doc_id'))
+        subgraph = graph.subgraph(
+            labels=payload.get('labels'),
+            actions=payload.get('actions'),
+            min_weight=int(payload.get('min_weight', 1)),
+            node=payload.get('node'),
+            top=None if top is None else int(top),
+            rank_by=rank_by,
+        )
+        return jsonify({**subgraph, 'labels': graph.labels, 'actions': graph.actions})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/models', methods=['GET'])
+def model_metrics():
+    """Load time and memory growth for each SpaCy pipeline loaded by this process."""
+    return jsonify({'pid': os.getpid(), 'loads': load_metrics()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage timings, rows and memory high-water marks in the Prometheus text format."""
+    return Response(prometheus_text(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True)
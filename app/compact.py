@@ -0,0 +1,123 @@
+import gzip
+import json
+import zlib
+
+# analysis_store puts the Streamlit dashboard's directory, home of these shared helpers, on sys.path
+import analysis_store
+from lru import LRUCache
+from vocabulary import Vocabulary
+
+try:
+    import brotli  # Optional, better compression than gzip for JSON
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+# Per-doc_id lookups built on first use: record positions per label or action
+MAX_CACHED_INDEXES = 32
+_indexes = LRUCache(MAX_CACHED_INDEXES)
+
+def encode_entities(entities):
+    """
+    Column-oriented encoding of entity records.
+
+    Entity texts, labels and source columns are each stored once in a vocabulary and
+    referenced by integer code; row, start and end are plain integers.
+    """
+    texts, labels, columns = Vocabulary(), Vocabulary(), Vocabulary()
+    encoded = {'text': [], 'label': [], 'row': [], 'column': [], 'start': [], 'end': []}
+    for entity in entities:
+        encoded['text'].append(texts.code(entity['text']))
+        encoded['label'].append(labels.code(entity['label']))
+        encoded['row'].append(entity.get('row'))
+        encoded['column'].append(columns.code(entity.get('column')))
+        encoded['start'].append(entity.get('start'))
+        encoded['end'].append(entity.get('end'))
+    return {'texts': texts.values, 'labels': labels.values, 'columns': columns.values, 'entities': encoded}
+
+def encode_relationships(relationships):
+    """Column-oriented encoding of relationship records, with subjects and objects sharing one vocabulary."""
+    terms, actions, columns = Vocabulary(), Vocabulary(), Vocabulary()
+    encoded = {'subject': [], 'action': [], 'object': [], 'row': [], 'column': []}
+    for rel in relationships:
+        encoded['subject'].append(terms.code(rel['subject']))
+        encoded['action'].append(actions.code(rel['action']))
+        encoded['object'].append(terms.code(rel['object']))
+        encoded['row'].append(rel.get('row'))
+        encoded['column'].append(columns.code(rel.get('column')))
+    return {'terms': terms.values, 'actions': actions.values, 'columns': columns.values, 'relationships': encoded}
+
+def _index(doc_id, analysis, kind, key):
+    """Positions of the records of one kind grouped by the value of key, built once per document."""
+    cache_key = (doc_id, kind, key)
+    index = _indexes.get(cache_key) if doc_id is not None else None
+    if index is None:
+        index = {}
+        for position, record in enumerate(analysis[kind]):
+            index.setdefault(record[key], []).append(position)
+        if doc_id is not None:
+            _indexes.put(cache_key, index)
+    return index
+
+def select(doc_id, analysis, kind, key, values=None):
+    """
+    Positions of the records of one kind whose key is one of values (all records if values is empty).
+
+    Returns:
+    - (positions, the distinct values of key in the document, for building filters)
+    """
+    index = _index(doc_id, analysis, kind, key)
+    if not values:
+        return range(len(analysis[kind])), list(index)
+    positions = sorted(position for value in values for position in index.get(value, ()))
+    return positions, list(index)
+
+def page_bounds(page, page_size, total):
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    start = (max(page, 1) - 1) * page_size
+    return start, min(start + page_size, total), page_size
+
+def ndjson_lines(records):
+    """Yield one JSON document per line, for streaming responses."""
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+def gzip_stream(chunks):
+    """Gzip-compress a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def accepted_encoding(accept_encoding):
+    """Pick 'br' (when brotli is installed) or 'gzip' from an Accept-Encoding header, or None."""
+    accept_encoding = (accept_encoding or '').lower()
+    if brotli is not None and 'br' in accept_encoding:
+        return 'br'
+    if 'gzip' in accept_encoding:
+        return 'gzip'
+    return None
+
+def compress_response(response, accept_encoding):
+    """Compress a buffered response body in place when the client accepts it and it is large enough."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code >= 300 or 'Content-Encoding' in response.headers):
+        return response
+    encoding = accepted_encoding(accept_encoding)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return response
+
+    response.set_data(brotli.compress(body, quality=5) if encoding == 'br' else gzip.compress(body, compresslevel=6))
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Length'] = len(response.get_data())
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,241 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import psutil  # Optional: a portable process liveness check
+except ImportError:
+    psutil = None
+
+# Rows-processed updates are written at most this often (seconds) to keep SQLite writes cheap
+PROGRESS_INTERVAL = 1.0
+
+# A job whose pool broke under it (another job's worker died) is run again at most this many times
+MAX_JOB_RETRIES = 2
+
+JOB_COLUMNS = (
+    'id', 'status', 'filename', 'file_path', 'doc_id', 'error',
+    'rows_processed', 'rows_total', 'created_at', 'started_at', 'finished_at',
+)
+
+def _connect(db_path):
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+def _update_job(db_path, job_id, **fields):
+    assignments = ', '.join(f"{name} = ?" for name in fields)
+    with _connect(db_path) as connection:
+        connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+
+def run_job(db_path, job_id, file_path, analysis_folder, chunked=True):
+    """
+    Worker-process entry point: analyze one upload and record progress in the job table.
+
+    Returns the stage timings recorded while running the job, for the parent to merge.
+    """
+    # Imported here so the process pool does not need to pickle the analysis module
+    from analysis import process_file, estimate_rows
+    from instrumentation import stage, snapshot, reset, profile_run
+
+    reset()  # Pool workers are reused; report only this job's stages
+    # The worker's pid tells the parent which job was running in a worker that died
+    _update_job(db_path, job_id, status='running', started_at=time.time(), rows_processed=0, worker_pid=os.getpid())
+    rows_total = estimate_rows(file_path)
+    _update_job(db_path, job_id, rows_total=rows_total)
+
+    last_update = 0.0
+
+    def progress(rows_processed):
+        nonlocal last_update
+        now = time.time()
+        if now - last_update >= PROGRESS_INTERVAL:
+            _update_job(db_path, job_id, rows_processed=rows_processed)
+            last_update = now
+
+    try:
+        with profile_run(f"job-{job_id}"), stage('analyze', rows=rows_total):
+            doc_id, _ = process_file(file_path, analysis_folder, chunked=chunked, progress=progress)
+    except Exception as e:
+        _update_job(db_path, job_id, status='failed', error=str(e), finished_at=time.time())
+        return snapshot()
+
+    with _connect(db_path) as connection:
+        connection.execute(
+            "UPDATE jobs SET status = 'done', doc_id = ?, finished_at = ?, "
+            "rows_processed = COALESCE(rows_total, rows_processed) WHERE id = ?",
+            (doc_id, time.time(), job_id),
+        )
+    return snapshot()
+
+def _init_worker(components):
+    """Pool initializer: load the SpaCy model once per worker, before its first job."""
+    from nlp_models import preload
+    preload(components=components)
+
+def _merge_job_metrics(future):
+    """Fold a finished job's stage timings into this process' metrics."""
+    if future.exception() is None and future.result():
+        from instrumentation import merge
+        merge(future.result())
+
+def _process_alive(pid):
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if os.name == 'nt':
+        # os.kill(pid, 0) would terminate the process on Windows. Servers there run in a single
+        # process (gunicorn is Unix-only), so jobs owned by any other pid are from an earlier run.
+        return pid == os.getpid()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # Exists, but belongs to another user
+        return True
+    return True
+
+class JobQueue:
+    """
+    Background analysis jobs backed by a SQLite job table and a local process pool.
+
+    Jobs survive in the table across restarts. Each job records the pid of the server
+    process that queued it (and whose pool runs it); when a queue starts, jobs still
+    queued or running whose owner is no longer alive were interrupted and are marked
+    as failed. Jobs owned by other live server workers are left alone.
+
+    When a pool worker dies (e.g. OOM-killed on a huge upload), only the job it was
+    running fails; the pool's other unfinished jobs are run again on a fresh pool.
+    """
+
+    def __init__(self, db_path, max_workers=None, preload_components=None):
+        self.db_path = db_path
+        self.max_workers = max_workers or os.cpu_count()
+        self.preload_components = preload_components
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        with _connect(db_path) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT, file_path TEXT, doc_id TEXT, error TEXT, "
+                "rows_processed INTEGER NOT NULL DEFAULT 0, rows_total INTEGER, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL, owner_pid INTEGER, worker_pid INTEGER)"
+            )
+            columns = {row['name'] for row in connection.execute("PRAGMA table_info(jobs)")}
+            for column in ('owner_pid', 'worker_pid'):  # Tables created before jobs recorded them
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} INTEGER")
+            self._recover_interrupted(connection)
+
+    def _recover_interrupted(self, connection):
+        """Fail the unfinished jobs whose owning process has exited."""
+        unfinished = connection.execute(
+            "SELECT id, owner_pid FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchall()
+        orphaned = [(row['id'],) for row in unfinished
+                    if row['owner_pid'] is None or not _process_alive(row['owner_pid'])]
+        connection.executemany(
+            "UPDATE jobs SET status = 'failed', error = 'Interrupted by a server restart', finished_at = ? "
+            "WHERE id = ? AND status IN ('queued', 'running')",
+            [(time.time(), job_id) for job_id, in orphaned],
+        )
+
+    @property
+    def executor(self):
+        # Created on first use so importing the app does not start worker processes. That happens
+        # on a request thread, so workers come from a fork server (or are spawned where there is
+        # none) rather than being forked from the multithreaded server, which could copy locks
+        # held by other threads into them. Each worker loads preload_components at start-up.
+        with self._executor_lock:
+            if self._executor is None:
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                initializer = (_init_worker, (self.preload_components,)) if self.preload_components else (None, ())
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context(start_method),
+                                                     initializer=initializer[0], initargs=initializer[1])
+            return self._executor
+
+    def _discard_executor(self, executor):
+        """Drop a broken pool (e.g. a worker was OOM-killed) so the next job starts a new one."""
+        with self._executor_lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _worker_died(self, job_id):
+        """Whether job_id was running in a pool worker that has since exited."""
+        with _connect(self.db_path) as connection:
+            row = connection.execute("SELECT status, worker_pid FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row['status'] != 'running':
+            return False
+        # Done-callbacks of a broken pool run before it stops its remaining workers, so the
+        # only worker missing here is the one that died
+        return row['worker_pid'] not in {process.pid for process in multiprocessing.active_children()}
+
+    def _job_finished(self, job_id, args, retries, executor, future):
+        error = future.exception()
+        if error is None:
+            _merge_job_metrics(future)
+            return
+        if isinstance(error, BrokenProcessPool):
+            self._discard_executor(executor)
+            # Every unfinished job of a broken pool fails with it; only the job whose worker
+            # died is at fault, so the others go back to the queue on a fresh pool
+            if retries < MAX_JOB_RETRIES and not self._worker_died(job_id):
+                _update_job(self.db_path, job_id, status='queued')
+                self._run(job_id, args, retries + 1)
+                return
+        # run_job records its own errors, so this is the worker process itself dying
+        with _connect(self.db_path) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (f"The analysis worker stopped unexpectedly: {error}", time.time(), job_id),
+            )
+
+    def _run(self, job_id, args, retries=0):
+        executor = self.executor
+        try:
+            future = executor.submit(run_job, self.db_path, job_id, *args)
+        except BrokenProcessPool:
+            # Broke before its done-callbacks ran; retry once on a fresh pool
+            self._discard_executor(executor)
+            executor = self.executor
+            future = executor.submit(run_job, self.db_path, job_id, *args)
+        future.add_done_callback(lambda future: self._job_finished(job_id, args, retries, executor, future))
+
+    def submit(self, filename, file_path, analysis_folder, chunked=True):
+        """Queue an upload for analysis and return its job ID immediately."""
+        job_id = uuid.uuid4().hex
+        with _connect(self.db_path) as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, status, filename, file_path, created_at, owner_pid) "
+                "VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, filename, file_path, time.time(), os.getpid()),
+            )
+        self._run(job_id, (file_path, analysis_folder, chunked))
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict with progress and ETA fields, or None if it does not exist."""
+        with _connect(self.db_path) as connection:
+            row = connection.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['progress'] = None
+        job['eta_seconds'] = None
+        if job['rows_total']:
+            job['progress'] = min(job['rows_processed'] / job['rows_total'], 1.0)
+            if job['status'] == 'running' and job['rows_processed']:
+                elapsed = time.time() - job['started_at']
+                remaining = max(job['rows_total'] - job['rows_processed'], 0)
+                job['eta_seconds'] = elapsed / job['rows_processed'] * remaining
+        return job
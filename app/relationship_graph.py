@@ -0,0 +1,238 @@
+from collections import defaultdict
+
+import numpy as np
+from scipy import sparse
+
+# analysis_store puts the Streamlit dashboard's directory, home of this shared helper, on sys.path
+import analysis_store
+from lru import LRUCache
+
+# Node metrics reported by RelationshipGraph.metrics(), any of which can rank a subgraph
+METRICS = ('in_degree', 'out_degree', 'weighted_degree', 'pagerank', 'betweenness')
+
+# Graphs built from stored analyses, keyed by doc_id
+MAX_CACHED_GRAPHS = 8
+_cache = LRUCache(MAX_CACHED_GRAPHS)
+
+class RelationshipGraph:
+    """
+    Deduplicated, weighted graph of an analysis' relationships.
+
+    Nodes are numbered 0..n-1 in a node table. Each distinct (subject, action, object)
+    is stored once with the number of times it was extracted as its weight, and the
+    adjacency matrix (subject -> object, summed over actions) is kept in CSR form.
+    Node entity types are a sparse node x label indicator matrix.
+    """
+
+    def __init__(self, nodes, edge_src, edge_dst, edge_action, edge_weight, actions, labels, node_labels):
+        self.nodes = nodes                  # node id -> text
+        self.node_ids = {text: node_id for node_id, text in enumerate(nodes)}
+        self.edge_src = edge_src            # per distinct triple: subject node id
+        self.edge_dst = edge_dst            # per distinct triple: object node id
+        self.edge_action = edge_action      # per distinct triple: index into actions
+        self.edge_weight = edge_weight      # per distinct triple: times extracted
+        self.actions = actions
+        self.labels = labels
+        self.node_labels = node_labels      # CSR (nodes x labels), 1 where an entity with that label has the node's text
+
+        n = len(nodes)
+        self.adjacency = sparse.csr_matrix((edge_weight, (edge_src, edge_dst)), shape=(n, n), dtype=np.float64)
+        self._metrics = None
+
+    @classmethod
+    def from_analysis(cls, analysis):
+        node_ids = {}
+        triple_counts = defaultdict(int)
+        action_ids = {}
+        for rel in analysis['relationships']:
+            src = node_ids.setdefault(rel['subject'], len(node_ids))
+            dst = node_ids.setdefault(rel['object'], len(node_ids))
+            action = action_ids.setdefault(rel['action'], len(action_ids))
+            triple_counts[(src, dst, action)] += 1
+
+        label_ids = {}
+        node_label_pairs = set()
+        for entity in analysis['entities']:
+            node = node_ids.get(entity['text'])
+            if node is not None:
+                node_label_pairs.add((node, label_ids.setdefault(entity['label'], len(label_ids))))
+
+        triples = np.array(list(triple_counts), dtype=np.int32).reshape(-1, 3)
+        pairs = np.array(sorted(node_label_pairs), dtype=np.int32).reshape(-1, 2)
+        node_labels = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])),
+            shape=(len(node_ids), len(label_ids)),
+        )
+        return cls(
+            nodes=list(node_ids),
+            edge_src=triples[:, 0],
+            edge_dst=triples[:, 1],
+            edge_action=triples[:, 2],
+            edge_weight=np.fromiter(triple_counts.values(), dtype=np.int32, count=len(triple_counts)),
+            actions=list(action_ids),
+            labels=list(label_ids),
+            node_labels=node_labels,
+        )
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def node_types(self, node):
+        row = self.node_labels.indices[self.node_labels.indptr[node]:self.node_labels.indptr[node + 1]]
+        return [self.labels[i] for i in row]
+
+    def degree(self):
+        """Per node (in_degree, out_degree, weighted_degree), counting distinct neighbours for the first two."""
+        structure = self.adjacency.astype(bool)
+        in_degree = np.asarray(structure.sum(axis=0)).ravel()
+        out_degree = np.diff(self.adjacency.indptr)
+        weighted = np.asarray(self.adjacency.sum(axis=0)).ravel() + np.asarray(self.adjacency.sum(axis=1)).ravel()
+        return in_degree, out_degree, weighted
+
+    def pagerank(self, damping=0.85, tol=1e-8, max_iter=100):
+        """Weighted PageRank by power iteration; dangling nodes spread their rank uniformly."""
+        n = len(self)
+        if n == 0:
+            return np.zeros(0)
+        out_weight = np.asarray(self.adjacency.sum(axis=1)).ravel()
+        dangling = out_weight == 0
+        inverse = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+        transition_t = (sparse.diags(inverse) @ self.adjacency).T.tocsr()
+
+        rank = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            previous = rank
+            rank = damping * (transition_t @ rank + rank[dangling].sum() / n) + (1 - damping) / n
+            if np.abs(rank - previous).sum() < n * tol:
+                break
+        return rank
+
+    def betweenness(self, k=64, seed=42):
+        """
+        Approximate betweenness on the undirected, unweighted graph from k sampled sources.
+
+        Brandes' algorithm with each BFS level computed as a sparse matrix-vector product;
+        scores are scaled up by n / k and normalized like networkx's.
+        """
+        n = len(self)
+        if n < 3:
+            return np.zeros(n)
+        structure = (self.adjacency + self.adjacency.T).astype(bool).astype(np.float64).tocsr()
+        structure.setdiag(0)
+        structure.eliminate_zeros()
+
+        sources = np.arange(n) if k >= n else np.random.default_rng(seed).choice(n, size=k, replace=False)
+        scores = np.zeros(n)
+        for source in sources:
+            sigma = np.zeros(n)
+            sigma[source] = 1.0
+            visited = np.zeros(n, dtype=bool)
+            visited[source] = True
+            levels = [np.array([source])]
+            frontier = sigma.copy()
+            # Forward: count shortest paths level by level
+            while True:
+                reached = structure @ frontier
+                reached[visited] = 0
+                level = np.flatnonzero(reached)
+                if len(level) == 0:
+                    break
+                sigma[level] = reached[level]
+                visited[level] = True
+                levels.append(level)
+                frontier = np.zeros(n)
+                frontier[level] = sigma[level]
+            # Backward: accumulate dependencies from the deepest level up
+            delta = np.zeros(n)
+            for parents, children in zip(reversed(levels[:-1]), reversed(levels[1:])):
+                contribution = np.zeros(n)
+                contribution[children] = (1 + delta[children]) / sigma[children]
+                delta[parents] = sigma[parents] * (structure @ contribution)[parents]
+            delta[source] = 0
+            scores += delta
+
+        # Each undirected path is counted from both ends; scale sampled sources up to all of them
+        scores *= (n / len(sources)) / 2
+        return scores / ((n - 1) * (n - 2) / 2)
+
+    def metrics(self):
+        """Degree, PageRank and betweenness for every node, computed once per graph."""
+        if self._metrics is None:
+            in_degree, out_degree, weighted = self.degree()
+            self._metrics = {
+                'in_degree': in_degree,
+                'out_degree': out_degree,
+                'weighted_degree': weighted,
+                'pagerank': self.pagerank(),
+                'betweenness': self.betweenness(),
+            }
+        return self._metrics
+
+    def subgraph(self, labels=None, actions=None, min_weight=1, node=None, top=None, rank_by='pagerank'):
+        """
+        Select the part of the graph a client asked for.
+
+        Parameters:
+        - labels (list of str, optional): Keep only edges with at least one endpoint of
+          one of these entity types (nodes are single tokens, so the other end is often untyped).
+        - actions (list of str, optional): Keep only edges with one of these actions.
+        - min_weight (int): Keep only edges extracted at least this many times.
+        - node (str, optional): Keep only the edges touching this node.
+        - top (int, optional): Keep only the top nodes by rank_by among those left.
+        - rank_by (str): One of the metrics() keys.
+
+        Returns:
+        - {'nodes': [...], 'edges': [...]} ready for jsonify.
+        """
+        for name, values in (('labels', labels), ('actions', actions)):
+            if values is not None and not isinstance(values, (list, tuple, set)):
+                raise TypeError(f"{name} must be a list of strings")
+        keep_edge = self.edge_weight >= min_weight
+        if actions is not None:
+            actions = set(actions)
+            action_ids = [i for i, action in enumerate(self.actions) if action in actions]
+            keep_edge &= np.isin(self.edge_action, action_ids)
+
+        keep_node = np.ones(len(self), dtype=bool)
+        if labels is not None:
+            labels = set(labels)
+            label_ids = [i for i, label in enumerate(self.labels) if label in labels]
+            keep_node = np.asarray(self.node_labels[:, label_ids].sum(axis=1)).ravel() > 0
+        if node is not None:
+            node_id = self.node_ids.get(node, -1)
+            keep_edge &= (self.edge_src == node_id) | (self.edge_dst == node_id)
+
+        metrics = self.metrics()
+        keep_edge &= keep_node[self.edge_src] | keep_node[self.edge_dst]
+        selected = np.union1d(self.edge_src[keep_edge], self.edge_dst[keep_edge])
+        if top is not None and len(selected) > top:
+            selected = selected[np.argsort(-metrics[rank_by][selected], kind='stable')[:top]]
+            in_selection = np.zeros(len(self), dtype=bool)
+            in_selection[selected] = True
+            keep_edge &= in_selection[self.edge_src] & in_selection[self.edge_dst]
+
+        nodes = []
+        for node_id in selected.tolist():
+            types = self.node_types(node_id)
+            nodes.append({
+                'id': node_id,
+                'label': self.nodes[node_id],
+                'group': types[0] if types else None,
+                'types': types,
+                **{name: values[node_id].item() for name, values in metrics.items()},
+            })
+        edges = [
+            {'from': int(src), 'to': int(dst), 'label': self.actions[action], 'weight': int(weight)}
+            for src, dst, action, weight in zip(self.edge_src[keep_edge], self.edge_dst[keep_edge],
+                                                self.edge_action[keep_edge], self.edge_weight[keep_edge])
+        ]
+        return {'nodes': nodes, 'edges': edges}
+
+def get_graph(analysis, doc_id=None):
+    """Return the RelationshipGraph of an analysis, building it once per stored doc_id."""
+    graph = _cache.get(doc_id) if doc_id is not None else None
+    if graph is None:
+        graph = RelationshipGraph.from_analysis(analysis)
+        if doc_id is not None:
+            _cache.put(doc_id, graph)
+    return graph
@@ -0,0 +1,275 @@
+"""
+Throughput benchmarks for the text processing pipeline.
+
+Usage:
+    python benchmark.py extraction [excel_file]
+    python benchmark.py validation
+    python benchmark.py suite [--sizes 1000 10000 100000] [--stages ...] [--output results.json]
+    python benchmark.py compare old_results.json new_results.json
+
+When no file is given, the example excerpts are repeated to build a corpus. The suite
+generates synthetic Column1/Text workbooks and times each pipeline stage in its own
+process, writing time, peak RSS and rows/sec per stage to JSON.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from extract_entities_relationships import extract_all, process_data
+from validate_data import validate_data, resolve_errors
+from processed_store import load_processed
+from topic_modeling import perform_lda_topic_modeling, dataset_hash
+from generate_insights import generate_insights
+from instrumentation import current_rss_bytes, peak_rss_bytes
+
+SAMPLE_TEXTS = [
+    "Pristina Airport – Possible administrative irregularity regarding tender procedures involving Vendor 1 and Vendor 2 Allegation",
+    "Investigative details In his/her interviews conducted on 31st August and 14th September 2004, Vendor 1 and Vendor 2 Representative admitted that the fact that both Vendor 1 and Vendor 2 took part together in three Airport tenders put other competitors at a disadvantage, but alleged both companies have never exchanged information with regard to the price offers.",
+]
+
+def load_texts(input_file=None, num_rows=2000):
+    """Load the 'Text' column of a workbook, or repeat the sample texts up to num_rows."""
+    if input_file:
+        return pd.read_excel(input_file)["Text"].fillna("").astype(str).tolist()
+    return [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] for i in range(num_rows)]
+
+def benchmark_extraction(texts, process_counts=(1, 2, 4, 8), batch_size=64):
+    """Time extract_all over texts for each process count and return rows/sec per count."""
+    results = {}
+    for n_process in process_counts:
+        start = time.perf_counter()
+        for _ in extract_all(texts, batch_size=batch_size, n_process=n_process):
+            pass
+        elapsed = time.perf_counter() - start
+        results[n_process] = len(texts) / elapsed if elapsed else float("inf")
+        print(f"extraction n_process={n_process}: {len(texts)} rows in {elapsed:.2f}s ({results[n_process]:.1f} rows/sec)")
+    return results
+
+def synthetic_texts(num_rows, subset_rate=0.05, seed=42):
+    """Build num_rows random sentences, a subset_rate share of which are fragments of earlier rows."""
+    rng = random.Random(seed)
+    # Pad the excerpt vocabulary with made-up words so rows are not trivially similar
+    vocabulary = " ".join(SAMPLE_TEXTS).split() + [f"term{k}" for k in range(20000)]
+    texts = []
+    for _ in range(num_rows):
+        if texts and rng.random() < subset_rate:
+            words = rng.choice(texts).split()
+            start = rng.randrange(len(words))
+            texts.append(" ".join(words[start:start + rng.randint(3, 10)]))
+        else:
+            texts.append(" ".join(rng.choice(vocabulary) for _ in range(rng.randint(20, 60))))
+    return texts
+
+def benchmark_validation(sizes=(1000, 10000, 100000), near_duplicate_threshold=0.8):
+    """Time validate_data on synthetic sheets of each size and return seconds per size."""
+    results = {}
+    for size in sizes:
+        df = pd.DataFrame({"Column1": [f"{i}.pdf" for i in range(size)], "Text": synthetic_texts(size)})
+        start = time.perf_counter()
+        validation_log = validate_data(df, near_duplicate_threshold=near_duplicate_threshold)
+        elapsed = time.perf_counter() - start
+        results[size] = elapsed
+        print(f"validation rows={size}: {len(validation_log)} errors in {elapsed:.2f}s ({size / elapsed:.1f} rows/sec)")
+    return results
+
+def synthetic_workbook(num_rows, duplicate_rate=0.05, subset_rate=0.05, rows_per_document=5, seed=42):
+    """
+    Build an ISD-style sheet: a 'Column1' source document name and a 'Text' excerpt per row.
+
+    Consecutive rows share a document name, a duplicate_rate share of rows are exact
+    copies of earlier rows, and a subset_rate share are fragments of earlier texts.
+    """
+    rng = random.Random(seed)
+    texts = synthetic_texts(num_rows, subset_rate=subset_rate, seed=seed)
+    documents = [f"{i // rows_per_document}.pdf" for i in range(num_rows)]
+    for i in range(1, num_rows):
+        if rng.random() < duplicate_rate:
+            j = rng.randrange(i)
+            documents[i], texts[i] = documents[j], texts[j]
+    return pd.DataFrame({"Column1": documents, "Text": texts})
+
+def write_workbook(df, path):
+    """Save a synthetic sheet as .xlsx, .csv or .parquet, depending on the extension."""
+    if path.endswith(".csv"):
+        df.to_csv(path, index=False)
+    elif path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+SUITE_STAGES = (
+    "validate_data", "resolve_errors", "process_data",
+    "perform_lda_topic_modeling", "generate_insights", "visualize_relationships",
+)
+# Stages that need the output of process_data
+PROCESSED_STAGES = ("perform_lda_topic_modeling", "generate_insights", "visualize_relationships")
+
+def _visualize_relationships(dataframe):
+    # The dashboard module configures the Streamlit page on import, so only import it when needed
+    from build_dashboard import visualize_relationships
+    all_relationships = [rel for sublist in dataframe["relationships"] for rel in sublist]
+    return visualize_relationships(all_relationships, dataset_hash(dataframe["Text"]))
+
+def _run_stage(name, paths):
+    """
+    Load a stage's inputs from the files in paths, then run and measure it (in a fresh process).
+
+    Inputs travel as file paths so the stage runs the same whether the process was forked
+    or spawned; loading them is not part of the measured time.
+    """
+    if name in PROCESSED_STAGES:
+        processed_data = load_processed(paths["processed"])
+    elif name != "process_data":
+        sheet = pd.read_parquet(paths["sheet"])
+    calls = {
+        "validate_data": lambda: validate_data(sheet),
+        "resolve_errors": lambda: resolve_errors(sheet),
+        "process_data": lambda: process_data(paths["workbook"], paths["processed"], cache_dir=None),
+        "perform_lda_topic_modeling": lambda: perform_lda_topic_modeling(processed_data),
+        "generate_insights": lambda: generate_insights(processed_data),
+        "visualize_relationships": lambda: _visualize_relationships(processed_data),
+    }
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    calls[name]()
+    seconds = time.perf_counter() - start
+    return seconds, peak_rss_bytes(), current_rss_bytes() - rss_before
+
+def time_stage(name, rows, paths):
+    """Time a stage in its own process so its peak RSS is not masked by earlier stages."""
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    result = {"stage": name, "rows": rows}
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            seconds, peak_bytes, rss_growth_bytes = executor.submit(_run_stage, name, paths).result()
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        print(f"{name} rows={rows}: FAILED ({result['error']})")
+        return result
+    result.update({
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds else None,
+        "peak_rss_bytes": peak_bytes,
+        "rss_growth_bytes": rss_growth_bytes,
+    })
+    print(f"{name} rows={rows}: {seconds:.2f}s ({result['rows_per_sec']:.1f} rows/sec, peak RSS {peak_bytes / 2**20:.0f} MB)")
+    return result
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark_suite(sizes=(1000, 10000, 100000), stages=SUITE_STAGES, duplicate_rate=0.05, subset_rate=0.05,
+                    file_format="xlsx", output="benchmark_results.json", seed=42):
+    """
+    Time each pipeline stage on synthetic workbooks of each size and write the results to JSON.
+
+    Returns:
+    - The results document that was written to output. Stages that failed have an
+      'error' entry instead of measurements, and are listed under 'failed'.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in sizes:
+            sheet = synthetic_workbook(size, duplicate_rate, subset_rate, seed=seed)
+            paths = {
+                "sheet": os.path.join(work_dir, f"sheet_{size}.parquet"),
+                "workbook": os.path.join(work_dir, f"synthetic_{size}.{file_format}"),
+                "processed": os.path.join(work_dir, f"processed_{size}.parquet"),
+            }
+            sheet.to_parquet(paths["sheet"], index=False)
+            write_workbook(sheet, paths["workbook"])
+
+            needs_processed = any(stage in stages for stage in PROCESSED_STAGES)
+            processed = None
+            if "process_data" in stages or needs_processed:
+                processed = time_stage("process_data", size, paths)
+                if "process_data" in stages:
+                    results.append(processed)
+
+            for stage in stages:
+                if stage == "process_data":
+                    continue
+                if stage in PROCESSED_STAGES and "error" in processed:
+                    results.append({"stage": stage, "rows": size, "error": "process_data failed"})
+                    continue
+                results.append(time_stage(stage, size, paths))
+
+    failed = [f"{result['stage']} rows={result['rows']}" for result in results if "error" in result]
+
+    document = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"sizes": list(sizes), "duplicate_rate": duplicate_rate, "subset_rate": subset_rate,
+                   "format": file_format, "seed": seed},
+        "results": results,
+        "failed": failed,
+    }
+    with open(output, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to {output}")
+    if failed:
+        print(f"{len(failed)} stage(s) failed: {', '.join(failed)}")
+    return document
+
+def compare_results(old_path, new_path):
+    """Print the change in time and peak RSS per (stage, rows) between two suite result files."""
+    def by_stage(path):
+        with open(path) as f:
+            return {(r["stage"], r["rows"]): r for r in json.load(f)["results"]}
+
+    old, new = by_stage(old_path), by_stage(new_path)
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        if "error" in before or "error" in after:
+            print(f"{key[0]} rows={key[1]}: FAILED in the {'new' if 'error' in after else 'old'} run")
+            continue
+        print(f"{key[0]} rows={key[1]}: {before['seconds']:.2f}s -> {after['seconds']:.2f}s "
+              f"({after['seconds'] / before['seconds']:.2f}x), peak RSS "
+              f"{before['peak_rss_bytes'] / 2**20:.0f} -> {after['peak_rss_bytes'] / 2**20:.0f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the text processing pipeline.")
+    commands = parser.add_subparsers(dest="benchmark")
+    extraction = commands.add_parser("extraction", help="Extraction throughput per process count.")
+    extraction.add_argument("excel_file", nargs="?")
+    commands.add_parser("validation", help="validate_data on synthetic sheets.")
+    suite = commands.add_parser("suite", help="Time every pipeline stage and write the results to JSON.")
+    suite.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    suite.add_argument("--stages", nargs="+", choices=SUITE_STAGES, default=list(SUITE_STAGES))
+    suite.add_argument("--duplicate-rate", type=float, default=0.05)
+    suite.add_argument("--subset-rate", type=float, default=0.05)
+    suite.add_argument("--format", choices=("xlsx", "csv", "parquet"), default="xlsx")
+    suite.add_argument("--output", default="benchmark_results.json")
+    compare = commands.add_parser("compare", help="Compare two suite result files.")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    args = parser.parse_args()
+
+    if args.benchmark == "validation":
+        benchmark_validation()
+    elif args.benchmark == "suite":
+        document = benchmark_suite(args.sizes, args.stages, args.duplicate_rate, args.subset_rate, args.format,
+                                   args.output)
+        if document["failed"]:
+            raise SystemExit(1)
+    elif args.benchmark == "compare":
+        compare_results(args.old, args.new)
+    else:
+        texts = load_texts(getattr(args, "excel_file", None))
+        benchmark_extraction(texts)
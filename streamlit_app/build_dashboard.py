@@ -3,13 +3,27 @@ import pandas as pd
 from generate_insights import generate_insights
 import plotly.express as px
 import plotly.graph_objects as go
-import networkx as nx
 from extract_entities_relationships import process_data
-from validate_data import validate_data
-import ast
+from validate_data import build_validation_report, resolve_errors
+from processed_store import load_texts
+from extraction_arrays import ExtractionArrays
+from ingest import read_table, SUPPORTED_FORMATS
 import string
-from topic_modeling import perform_lda_topic_modeling, plot_lda_topics  # Import the LDA functions
-from text_search import highlight_entities
+import hashlib
+import io
+import os
+import tempfile
+from topic_modeling import perform_lda_topic_modeling, plot_lda_topics, start_topic_sweep, DEFAULT_TOPIC_COUNTS  # Import the LDA functions
+from text_search import highlight_entities, highlight_texts
+from search_index import InvertedIndex
+from entity_index import EntityIndex
+from network_graph import relationship_network, plot_network, DEFAULT_MAX_EDGES
+from instrumentation import stage, cached_stage, cache_miss, cache_table, performance_table, profile_run
+from watchlist import Watchlist
+
+SEARCH_PAGE_SIZE = 10
+PROCESSED_DIR = os.path.join(tempfile.gettempdir(), "team3000-processed")
+SWEEP_POLL_SECONDS = 2
 
 
 # Set page configuration for wide layout & add custom CSS for styling
@@ -63,24 +77,103 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Function to resolve errors and clean the dataset
-def resolve_errors(df):
-    resolved_messages = []
-    duplicates = df[df.duplicated(subset=['Text'], keep=False)]
-    df = df.drop_duplicates(subset=['Text'])
-    if not duplicates.empty:
-        resolved_messages.append(f"✅ Removed {len(duplicates)} duplicate entries.")
-
-    missing_values = df[df['Text'].isna()]
-    if not missing_values.empty:
-        df = df.dropna(subset=['Text'])
-        resolved_messages.append(f"✅ Removed {len(missing_values)} rows with missing text values.")
-
-    first_column_name = df.columns[0]
-    df_combined = df.groupby(first_column_name)['Text'].apply(lambda x: ' '.join(x)).reset_index()
-    resolved_messages.append(f"✅ Combined texts for rows with the same '{first_column_name}'.")
-
-    return df_combined, resolved_messages
+# Dashboard stages. Each one is memoized on the fingerprints of its inputs (the leading
+# key arguments; underscored arguments are left out of Streamlit's hashing), so a widget
+# change only recomputes the stages downstream of it. Results are shared read-only with
+# st.cache_resource rather than copied out of st.cache_data on every rerun:
+#   read -> validate -> resolve
+#   read (+ watchlist) -> extract -> aggregate -> graph
+#                                 -> topics
+#                                 -> search index
+
+@st.cache_resource(show_spinner="Reading file...")
+def read_upload(upload_key, _upload):
+    cache_miss("read")
+    with stage("read") as run:
+        df = read_table(_upload)
+        run.rows = len(df)
+    return df
+
+@st.cache_resource(show_spinner="Validating data...")
+def validate_upload(upload_key, _df):
+    cache_miss("validate")
+    with stage("validate", rows=len(_df)):
+        return build_validation_report(_df)
+
+@st.cache_resource(show_spinner="Resolving errors...")
+def resolve_upload(upload_key, _df, _report):
+    cache_miss("resolve")
+    with stage("resolve", rows=len(_df)):
+        df, resolved_messages = resolve_errors(_df, _report)
+        # The cleaned workbook offered for download
+        workbook = io.BytesIO()
+        df.to_excel(workbook, index=False)
+    return df, resolved_messages, workbook.getvalue()
+
+@st.cache_resource(show_spinner="Extracting entities and relationships...")
+def extract_upload(extract_key, _upload, _watchlist, statistical):
+    cache_miss("extract")  # process_data records its own "extract" timings
+    # One file per extraction key: the cache is shared by every session, so a fixed name would
+    # let concurrent uploads overwrite each other's results. process_data raises on failure, so
+    # failed runs are never cached.
+    processed_file = os.path.join(PROCESSED_DIR, f"{hashlib.sha256(extract_key.encode('utf-8')).hexdigest()}.parquet")
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+    entity_index = EntityIndex()
+    process_data(_upload, processed_file, entity_index=entity_index, watchlist=_watchlist, statistical=statistical)
+    # Texts as a dataframe; entities and relationships as interned code arrays instead of lists of tuples
+    return load_texts(processed_file), ExtractionArrays.from_processed(processed_file), entity_index
+
+@st.cache_resource(show_spinner="Counting entities and relationships...")
+def aggregate(extract_key, _extractions):
+    cache_miss("aggregate")
+    with stage("aggregate", rows=_extractions.num_rows):
+        entity_counts, relationship_counts = generate_insights(_extractions)
+        all_relationships = _extractions.relationship_tuples()
+    return entity_counts, relationship_counts, all_relationships
+
+@st.cache_resource(show_spinner="Fitting topics...")
+def get_topics(extract_key, _dataframe, num_topics):
+    cache_miss("topics")
+    with stage("topics", rows=len(_dataframe)):
+        topics, lda_model, vectorizer = perform_lda_topic_modeling(_dataframe, num_topics)
+        return topics, plot_lda_topics(lda_model, vectorizer, num_topics)
+
+@st.cache_resource(show_spinner="Laying out the relationship network...")
+def get_relationship_figure(extract_key, _relationships, min_weight, max_edges, collapse):
+    cache_miss("graph")
+    with stage("graph", rows=len(_relationships)):
+        return visualize_relationships(_relationships, extract_key, min_weight=min_weight,
+                                       max_edges=max_edges, collapse=collapse)
+
+# Build the keyword search index once per dataset (the underscore keeps texts out of Streamlit's hashing)
+@st.cache_resource(show_spinner="Indexing documents for search...")
+def get_search_index(dataset_key, _texts):
+    cache_miss("search index")
+    with stage("search index", rows=len(_texts)):
+        return InvertedIndex.from_texts(_texts)
+
+# Build the watchlist matcher once per uploaded watchlist file
+@st.cache_resource(show_spinner="Loading watchlist...")
+def get_watchlist(watchlist_key, _source):
+    return Watchlist.from_table(_source)
+
+# Function to fingerprint an uploaded file, hashing its bytes only once per upload rather than on every rerun
+def upload_fingerprint(uploaded_file):
+    fingerprints = st.session_state.setdefault("upload_fingerprints", {})
+    if uploaded_file.file_id not in fingerprints:
+        fingerprints[uploaded_file.file_id] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return fingerprints[uploaded_file.file_id]
+
+# Poll a running topic sweep, rerunning the page once it finishes so the recommendation appears
+@st.fragment(run_every=SWEEP_POLL_SECONDS)
+def wait_for_topic_sweep(topic_sweep):
+    if not topic_sweep.done():
+        st.caption("⏳ Comparing topic counts in the background...")
+    elif topic_sweep.exception() is not None:
+        # Not rerun automatically, so a failing sweep is retried on the next interaction only
+        st.caption(f"⚠️ Topic count comparison failed: {topic_sweep.exception()}")
+    else:
+        st.rerun()
 
 # Function to visualize entities
 def visualize_entities(entity_counts):
@@ -100,104 +193,73 @@ def visualize_entities(entity_counts):
     return fig
 
 # Function to visualize relationships
-def visualize_relationships(all_relationships):
-    G = nx.Graph()
-    for rel in all_relationships:
-        if isinstance(rel, tuple) and len(rel) == 3:
-            subject, verb, obj = rel
-            G.add_node(subject)
-            G.add_node(obj)
-            G.add_edge(subject, obj, label=verb)
-    
+# Only the strongest edges are drawn; graphs and layouts are cached per dataset and options
+def visualize_relationships(all_relationships, dataset_key, min_weight=1, max_edges=DEFAULT_MAX_EDGES, collapse=False):
+    G, positions = relationship_network(all_relationships, dataset_key, min_weight=min_weight,
+                                        max_edges=max_edges, collapse=collapse)
+
     if len(G.nodes) == 0:
         st.warning("⚠️ No relationships found in the dataset.")
         return go.Figure()
 
-    pos = nx.spring_layout(G)
-    edge_x, edge_y = [], []
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        edge_x.extend([x0, x1, None])
-        edge_y.extend([y0, y1, None])
-
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=edge_x, y=edge_y,
-        line=dict(width=0.5, color='#004080'),
-        hoverinfo='none',
-        mode='lines'
-    ))
-    fig.add_trace(go.Scatter(
-        x=[pos[node][0] for node in G.nodes()],
-        y=[pos[node][1] for node in G.nodes()],
-        mode='markers+text',
-        text=list(G.nodes()),
-        textposition="top center",
-        textfont=dict(color='black'),
-        marker=dict(size=20, color='lightblue', line=dict(width=2, color='darkblue')),
-        hoverinfo='text'
-    ))
-    fig.update_layout(
-        title='Relationship Network',
-        showlegend=False,
-        hovermode='closest',
-        margin=dict(b=20, l=5, r=5, t=40),
-        xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-        yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-        height=500
-    )
-    return fig
+    return plot_network(G, positions)
 
 # Main function
 def main():
     st.markdown('<h1 class="title">Entity and Relationship Dashboard</h1>', unsafe_allow_html=True)
 
     # File upload section
-    uploaded_file = st.file_uploader("📂 Upload an Excel file", type=["xlsx"])
+    uploaded_file = st.file_uploader("📂 Upload an Excel, CSV or Parquet file", type=list(SUPPORTED_FORMATS))
+
+    # Optional watchlist of known names (a 'term' and a 'label' column), matched on top of the model
+    watchlist_file = st.sidebar.file_uploader("🎯 Watchlist", type=list(SUPPORTED_FORMATS),
+                                              help="A table with 'term' and 'label' columns of names to always tag.")
+    watchlist_key = upload_fingerprint(watchlist_file) if watchlist_file else None
+    watchlist = get_watchlist(watchlist_key, watchlist_file) if watchlist_file else None
+    watchlist_only = st.sidebar.checkbox("Watchlist only (much faster, no relationships)", disabled=watchlist is None)
     if uploaded_file:
-        input_file = "uploaded_file.xlsx"
-        with open(input_file, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-
-        df = pd.read_excel(input_file)
+        # Read straight from the upload buffer instead of saving a copy to disk first
+        upload_key = f"{uploaded_file.name}:{upload_fingerprint(uploaded_file)}"
+        with cached_stage("read"):
+            df = read_upload(upload_key, uploaded_file)
 
         # Step 1: Validate the data and show errors
-        validation_log = validate_data(df)
+        with cached_stage("validate"):
+            validation_report = validate_upload(upload_key, df)
+        validation_log = validation_report.log
         if not validation_log.empty:
             st.markdown('<div class="section"><h3 class="subheader">Validation Errors</h3></div>', unsafe_allow_html=True)
             st.write(validation_log)
 
         # Step 2: Automatically resolve the errors
-        df, resolved_messages = resolve_errors(df)
+        with cached_stage("resolve"):
+            df, resolved_messages, resolved_workbook = resolve_upload(upload_key, df, validation_report)
         
         if resolved_messages:
             st.markdown('<div class="section"><h3 class="subheader">✅ Resolved Errors</h3></div>', unsafe_allow_html=True)
             for message in resolved_messages:
                 st.success(message)
 
-        # Save the updated DataFrame after resolving errors
-        output_file = "resolved_file.xlsx"
-        df.to_excel(output_file, index=False)
-
         # Download button for cleaned data
-        with open(output_file, "rb") as file:
-            st.download_button(label="⬇️ Download the cleaned Excel file",
-                               data=file,
-                               file_name="resolved_data.xlsx",
-                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        st.download_button(label="⬇️ Download the cleaned Excel file",
+                           data=resolved_workbook,
+                           file_name="resolved_data.xlsx",
+                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
         # Step 3: Process and analyze the cleaned data
-        process_data(input_file, output_file)
-
-        dataframe = pd.read_excel(output_file)
-        dataframe["entities"] = dataframe["entities"].apply(ast.literal_eval)
-        dataframe["relationships"] = dataframe["relationships"].apply(ast.literal_eval)
-
-        all_entities = [entity for sublist in dataframe["entities"] for entity in sublist]
-        all_relationships = [rel for sublist in dataframe["relationships"] for rel in sublist]
-
-        entity_counts, relationship_counts = generate_insights(dataframe)
+        statistical = not (watchlist is not None and watchlist_only)
+        extract_key = f"{upload_key}:{watchlist_key}:{statistical}"
+        try:
+            with cached_stage("extract"):
+                dataframe, extractions, entity_index = extract_upload(extract_key, uploaded_file, watchlist, statistical)
+        except Exception as e:
+            st.error(f"⚠️ Could not extract entities and relationships: {e}")
+            return
+        with cached_stage("search index"):
+            search_index = get_search_index(extract_key, dataframe["Text"].tolist())
+
+        with cached_stage("aggregate"):
+            entity_counts, relationship_counts, all_relationships = aggregate(extract_key, extractions)
 
         # 2x2 Dashboard Layout
         col1, col2 = st.columns(2)
@@ -211,20 +273,38 @@ def main():
 
         with col2:
             st.subheader("🔗 Relationship Network")
-            relationship_fig = visualize_relationships(all_relationships)
+            network_options = st.columns(3)
+            max_edges = network_options[0].number_input("Max edges", min_value=10, value=DEFAULT_MAX_EDGES, step=100, key="network_max_edges")
+            min_weight = network_options[1].number_input("Min mentions", min_value=1, value=1, key="network_min_weight")
+            collapse = network_options[2].checkbox("Group communities", key="network_collapse")
+            with cached_stage("graph"):
+                relationship_fig = get_relationship_figure(extract_key, all_relationships, int(min_weight),
+                                                           int(max_edges), collapse)
             st.plotly_chart(relationship_fig, use_container_width=True)
 
         with col3:
             st.subheader("📂 Topic Modeling")
-            num_topics = st.slider("Number of Topics", 2, 10, 5)
-            topics, lda_model, vectorizer = perform_lda_topic_modeling(dataframe, num_topics)
+
+            # Every candidate topic count is fitted in the background; once done, the slider
+            # switches between cached models instantly
+            topic_sweep = start_topic_sweep(dataframe, key=extract_key)
+            if topic_sweep.done() and topic_sweep.exception() is None:
+                topic_scores, recommended_topics = topic_sweep.result()
+                st.caption(f"💡 Recommended number of topics: **{recommended_topics}** (highest coherence)")
+                with st.expander("📈 Topic count comparison"):
+                    st.dataframe(topic_scores, hide_index=True)
+            else:
+                wait_for_topic_sweep(topic_sweep)
+
+            num_topics = st.slider("Number of Topics", min(DEFAULT_TOPIC_COUNTS), max(DEFAULT_TOPIC_COUNTS), 5)
+            with cached_stage("topics"):
+                topics, lda_fig = get_topics(extract_key, dataframe, num_topics)
             with st.expander("📌 View Topics", expanded=True):
                 for topic, words in topics:
                     st.write(f"**{topic}:** {', '.join(words)}")
 
         with col4:
             st.subheader("📑 LDA Topic Visualization")
-            lda_fig = plot_lda_topics(lda_model, vectorizer, num_topics)
             st.plotly_chart(lda_fig, use_container_width=True)
 
         with col5:
@@ -248,27 +328,56 @@ def main():
             st.subheader("🔍 Search Tool")
 
             # Search box
-            search_query = st.text_input("Enter an incident or keyword to search:", key="incident_search")
+            search_query = st.text_input(
+                "Enter an incident or keyword to search:",
+                key="incident_search",
+                help='All words must match. Use "quotes" for phrases, OR for alternatives and -word to exclude. '
+                     'Search extracted data with LABEL:entity (e.g. ORG:Vendor 1) or '
+                     'subject:/verb:/object: (e.g. subject:"Vendor 1" verb:admitted).'
+            )
 
             if search_query:
-                matching_rows = dataframe[dataframe["Text"].str.contains(search_query, case=False, na=False)]
+                # A new query starts again from its first page
+                if st.session_state.get("search_page_query") != search_query:
+                    st.session_state["search_page_query"] = search_query
+                    st.session_state["search_page"] = 1
+                page = st.session_state.get("search_page", 1)
+
+                # Entity and relationship queries are answered from the entity index, anything else by
+                # keyword; either way the query runs once per rerun and yields the count and the page
+                entity_rows = entity_index.search(search_query)
+                if entity_rows is not None:
+                    entity_rows = sorted(entity_rows)
+                    total_matches = len(entity_rows)
+                    page_rows = entity_rows[(page - 1) * SEARCH_PAGE_SIZE:page * SEARCH_PAGE_SIZE]
+                else:
+                    total_matches, page_results = search_index.search(search_query, page=page, page_size=SEARCH_PAGE_SIZE)
+                    page_rows = [doc_id for doc_id, _ in page_results]
 
-                if not matching_rows.empty:
-                    st.markdown(f"### 🎯 Results for: **{search_query}**")
+                if total_matches:
+                    st.markdown(f"### 🎯 {total_matches} results for: **{search_query}**")
+                    total_pages = -(-total_matches // SEARCH_PAGE_SIZE)
+                    if total_pages > 1:
+                        st.number_input("Page", min_value=1, max_value=total_pages, key="search_page")
 
-                    for index, row in matching_rows.iterrows():
-                        # Remove excessive newlines and format as a single paragraph
-                        formatted_text = " ".join(row['Text'].splitlines())  # Converts multiple lines into a single paragraph
+                    # Remove excessive newlines and format each result as a single paragraph
+                    formatted_texts = [" ".join(dataframe["Text"].iat[doc_id].splitlines()) for doc_id in page_rows]
 
-                        # Display the formatted text as a clean paragraph
-                        st.markdown(f"📌 {formatted_text}", unsafe_allow_html=True)
+                    # Highlight the whole page in one batch; pages seen before reuse their parsed Docs
+                    for highlighted_text, _ in highlight_texts(formatted_texts):
+                        st.markdown(f"📌 {highlighted_text}", unsafe_allow_html=True)
 
                 else:
                     st.warning("⚠️ No matching incidents found.")
 
+        # Timings of the latest computation of each stage (a stage served from its cache is not re-timed)
+        with st.expander("⏱️ Performance"):
+            st.dataframe(pd.DataFrame(performance_table()), hide_index=True)
 
+        # Which stages this interaction recomputed, and hit/miss totals since the server started
+        with st.expander("🧮 Stage cache"):
+            st.dataframe(pd.DataFrame(cache_table()), hide_index=True)
 
- 
     # Custom CSS for styling highlights
     st.markdown("""
         <style>
@@ -281,4 +390,6 @@ def main():
     """, unsafe_allow_html=True)
 
 if __name__ == "__main__":
-    main()
+    # Set TEAM3000_PROFILE=cprofile (or pyinstrument) to write a profile of each run
+    with profile_run("dashboard"):
+        main()
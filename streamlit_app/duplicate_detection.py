@@ -0,0 +1,160 @@
+# duplicate_detection.py
+
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+# Modulus for the MinHash permutations; keeps a * x + b within uint64
+MERSENNE_PRIME = (1 << 31) - 1
+
+def _group_rows(texts):
+    """Map each distinct non-empty text to the row positions it appears at."""
+    groups = defaultdict(list)
+    for position, text in enumerate(texts):
+        if text:
+            groups[text].append(position)
+    return groups
+
+def _containment_candidates(tokens, postings, vocabulary, substring_cache):
+    """
+    Return the ids of distinct texts that could contain the text made of tokens.
+
+    A containing text must have every interior token as a whole token, so the rarest
+    interior token's posting list bounds the candidates. Texts of one or two tokens may
+    only match part of a token, so their longest token is looked up as a substring of
+    the vocabulary instead.
+    """
+    if len(tokens) >= 3:
+        rarest = min(tokens[1:-1], key=lambda token: len(postings[token]))
+        return postings[rarest]
+
+    longest = max(tokens, key=len)
+    if longest not in substring_cache:
+        candidates = set()
+        for token in vocabulary:
+            if longest in token:
+                candidates.update(postings[token])
+        substring_cache[longest] = candidates
+    return substring_cache[longest]
+
+def find_subset_pairs(texts):
+    """
+    Find every pair of rows where one text is contained in the other.
+
+    Parameters:
+    - texts (list of str): Cleaned texts; empty strings are ignored.
+
+    Returns:
+    - A list of (i, j, subset_row, superset_row) tuples sorted by (i, j), where i < j are
+      row positions and subset_row is contained in superset_row. Identical texts are
+      reported as i being a subset of j.
+    """
+    groups = _group_rows(texts)
+    distinct = list(groups)
+    tokenized = [text.split(' ') for text in distinct]
+
+    postings = defaultdict(set)
+    for text_id, tokens in enumerate(tokenized):
+        for token in tokens:
+            postings[token].add(text_id)
+    vocabulary = list(postings)
+    substring_cache = {}
+
+    pairs = []
+
+    # Identical texts contain each other
+    for rows in groups.values():
+        for a in range(len(rows)):
+            for b in range(a + 1, len(rows)):
+                pairs.append((rows[a], rows[b], rows[a], rows[b]))
+
+    # Strict containment, verified only against indexed candidates
+    for text_id, tokens in enumerate(tokenized):
+        text = distinct[text_id]
+        for candidate_id in _containment_candidates(tokens, postings, vocabulary, substring_cache):
+            candidate = distinct[candidate_id]
+            if len(candidate) <= len(text) or text not in candidate:
+                continue
+            for subset_row in groups[text]:
+                for superset_row in groups[candidate]:
+                    i, j = sorted((subset_row, superset_row))
+                    pairs.append((i, j, subset_row, superset_row))
+
+    pairs.sort()
+    return pairs
+
+def _shingles(text, shingle_size):
+    tokens = text.split(' ')
+    if len(tokens) <= shingle_size:
+        return {' '.join(tokens)}
+    return {' '.join(tokens[k:k + shingle_size]) for k in range(len(tokens) - shingle_size + 1)}
+
+def _choose_bands(num_perm, threshold):
+    """Pick the (bands, rows) split whose LSH S-curve midpoint is closest to threshold."""
+    best = None
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        midpoint = (1 / bands) ** (1 / rows)
+        if best is None or abs(midpoint - threshold) < best[0]:
+            best = (abs(midpoint - threshold), bands, rows)
+    return best[1], best[2]
+
+def minhash_signatures(shingle_sets, num_perm=128, seed=42):
+    """Compute a (len(shingle_sets), num_perm) MinHash signature matrix."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(shingle_sets), num_perm), dtype=np.uint64)
+    for k, shingles in enumerate(shingle_sets):
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        hashes %= MERSENNE_PRIME
+        signatures[k] = ((a[:, None] * hashes[None, :] + b[:, None]) % MERSENNE_PRIME).min(axis=1)
+    return signatures
+
+def find_near_duplicate_pairs(texts, threshold=0.8, num_perm=128, shingle_size=3):
+    """
+    Find pairs of rows whose word-shingle Jaccard similarity is at least threshold.
+
+    Candidates come from MinHash LSH banding and are confirmed with the exact Jaccard
+    similarity, so the result has no false positives. Identical texts are skipped since
+    find_subset_pairs already reports them.
+
+    Returns:
+    - A list of (i, j, similarity) tuples sorted by (i, j), where i < j are row positions.
+    """
+    groups = _group_rows(texts)
+    distinct = list(groups)
+    if len(distinct) < 2:
+        return []
+
+    shingle_sets = [_shingles(text, shingle_size) for text in distinct]
+    signatures = minhash_signatures(shingle_sets, num_perm)
+    bands, rows = _choose_bands(num_perm, threshold)
+
+    candidates = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        band_signatures = signatures[:, band * rows:(band + 1) * rows]
+        for text_id in range(len(distinct)):
+            buckets[band_signatures[text_id].tobytes()].append(text_id)
+        for members in buckets.values():
+            for a in range(len(members)):
+                for b in range(a + 1, len(members)):
+                    candidates.add((members[a], members[b]))
+
+    pairs = []
+    for a, b in candidates:
+        intersection = len(shingle_sets[a] & shingle_sets[b])
+        similarity = intersection / (len(shingle_sets[a]) + len(shingle_sets[b]) - intersection)
+        if similarity < threshold:
+            continue
+        for row_a in groups[distinct[a]]:
+            for row_b in groups[distinct[b]]:
+                i, j = sorted((row_a, row_b))
+                pairs.append((i, j, similarity))
+
+    pairs.sort()
+    return pairs
@@ -0,0 +1,103 @@
+# entity_index.py
+
+import pickle
+import re
+from collections import defaultdict
+
+# LABEL:entity text, e.g. ORG:Vendor 1
+ENTITY_QUERY_PATTERN = re.compile(r"^\s*([A-Z_]+):\s*(.+?)\s*$")
+# subject:X verb:Y object:Z, with "quotes" around multi-word values
+RELATIONSHIP_QUERY_PATTERN = re.compile(r'\b(subject|verb|object):\s*(?:"([^"]*)"|(\S+))', re.IGNORECASE)
+
+def normalize(text):
+    return " ".join(str(text).lower().split())
+
+class EntityIndex:
+    """
+    Row lookups by extracted entity and by (subject, verb, object) relationship.
+
+    Every lookup is a dictionary access, so queries take constant time however many
+    rows have been indexed. Rows are added one at a time as they are extracted.
+    """
+
+    def __init__(self):
+        self.entity_rows = defaultdict(set)        # (text, label) -> row ids
+        self.entity_labels = defaultdict(set)      # text -> labels seen for it
+        self.triple_rows = defaultdict(set)        # (subject, verb, object) -> row ids
+        self.triples_by_role = {role: defaultdict(set) for role in ("subject", "verb", "object")}
+        self.labels = set()
+
+    def add_row(self, row_id, entities, relationships):
+        for text, label in entities:
+            text = normalize(text)
+            self.entity_rows[(text, label)].add(row_id)
+            self.entity_labels[text].add(label)
+            self.labels.add(label)
+        for triple in relationships:
+            triple = tuple(normalize(part) for part in triple)
+            self.triple_rows[triple].add(row_id)
+            for role, value in zip(("subject", "verb", "object"), triple):
+                self.triples_by_role[role][value].add(triple)
+
+    def add_dataframe(self, dataframe):
+        """Index a processed dataframe, using its index as the row ids."""
+        for row_id, entities, relationships in zip(dataframe.index, dataframe["entities"], dataframe["relationships"]):
+            self.add_row(row_id, entities, relationships)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def find_entity(self, text, label=None):
+        """Rows mentioning an entity, optionally restricted to one label."""
+        text = normalize(text)
+        labels = [label] if label is not None else self.entity_labels.get(text, ())
+        rows = set()
+        for entity_label in labels:
+            rows |= self.entity_rows.get((text, entity_label), set())
+        return rows
+
+    def find_relationships(self, subject=None, verb=None, object_=None):
+        """
+        Relationships matching every given part.
+
+        Returns:
+        - {(subject, verb, object): row ids}
+        """
+        constraints = [(role, normalize(value)) for role, value in
+                       (("subject", subject), ("verb", verb), ("object", object_)) if value is not None]
+        if not constraints:
+            return {}
+        candidate_sets = sorted((self.triples_by_role[role].get(value, set()) for role, value in constraints), key=len)
+        triples = set(candidate_sets[0])
+        for candidates in candidate_sets[1:]:
+            triples &= candidates
+        return {triple: self.triple_rows[triple] for triple in triples}
+
+    def search(self, query):
+        """
+        Answer an entity or relationship query.
+
+        Accepts 'LABEL:entity text' (e.g. 'ORG:Vendor 1') or any combination of
+        'subject:', 'verb:' and 'object:' (e.g. 'subject:"Vendor 1" verb:admitted').
+
+        Returns:
+        - The matching row ids, or None if the query uses neither syntax.
+        """
+        parts = {role.lower(): quoted or bare
+                 for role, quoted, bare in RELATIONSHIP_QUERY_PATTERN.findall(query)}
+        if parts:
+            rows = set()
+            for triple_rows in self.find_relationships(parts.get("subject"), parts.get("verb"), parts.get("object")).values():
+                rows |= triple_rows
+            return rows
+
+        match = ENTITY_QUERY_PATTERN.match(query)
+        if match and match.group(1) in self.labels:
+            return self.find_entity(match.group(2), match.group(1))
+        return None
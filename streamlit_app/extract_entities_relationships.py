@@ -36,19 +36,33 @@
 
 
 import spacy
-import pandas as pd
+from extraction_cache import ExtractionCache, DEFAULT_CACHE_DIR
+from processed_store import open_processed_writer, to_table, load_processed
+from ingest import iter_row_batches
+from nlp_models import get_nlp, disabled_components, ENTITY_COMPONENTS, RELATIONSHIP_COMPONENTS
+from instrumentation import stage
 
-# Load the SpaCy model
-nlp = spacy.load("en_core_web_sm")
+DEFAULT_BATCH_SIZE = 64
 
-# Function to extract entities
-def extract_entities(text):
-    doc = nlp(text)
+def get_pipeline(entities=True, relationships=True):
+    """
+    Return the shared SpaCy pipeline for the requested outputs, loading it on first use,
+    together with the components to disable while parsing.
+    """
+    needed = set()
+    if entities:
+        needed.update(ENTITY_COMPONENTS)
+    if relationships:
+        needed.update(RELATIONSHIP_COMPONENTS)
+    nlp = get_nlp(components=needed)
+    return nlp, disabled_components(nlp, needed)
+
+# Function to read entities from a parsed Doc
+def entities_from_doc(doc):
     return [(ent.text, ent.label_) for ent in doc.ents]
 
-# Function to extract relationships
-def extract_relationships(text):
-    doc = nlp(text)
+# Function to read (subject, verb, object) relationships from a parsed Doc
+def relationships_from_doc(doc):
     relationships = []
     for sent in doc.sents:
         for token in sent:
@@ -64,21 +78,138 @@ def extract_relationships(text):
                     relationships.append((subject, token.text, object_))
     return relationships
 
+# Function to extract entities
+def extract_entities(text):
+    nlp, disable = get_pipeline(relationships=False)
+    doc = nlp(text, disable=disable)
+    return entities_from_doc(doc)
+
+# Function to extract relationships
+def extract_relationships(text):
+    nlp, disable = get_pipeline(entities=False)
+    doc = nlp(text, disable=disable)
+    return relationships_from_doc(doc)
+
+def extract_all(texts, batch_size=DEFAULT_BATCH_SIZE, n_process=1, entities=True, relationships=True, watchlist=None):
+    """
+    Stream texts through nlp.pipe, parsing each one exactly once.
+
+    Parameters:
+    - texts (iterable of str): The texts to parse.
+    - batch_size (int): Number of texts buffered per nlp.pipe batch.
+    - n_process (int): Number of worker processes used by nlp.pipe.
+    - entities (bool): Whether to extract entities (enables the NER component).
+    - relationships (bool): Whether to extract relationships (enables the tagger and parser).
+    - watchlist (Watchlist, optional): Also tag known terms. Its hits are merged with the
+      statistical entities; with entities and relationships both off, texts are only
+      tokenized and the watchlist hits are the only entities.
+
+    Yields:
+    - (entities, relationships) for each text, in input order.
+    """
+    if watchlist is not None and not entities and not relationships:
+        for hits in watchlist.extract(texts, batch_size=max(batch_size, 1000)):
+            yield hits, []
+        return
+
+    nlp, disable = get_pipeline(entities, relationships)
+    for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=disable):
+        if watchlist is not None:
+            doc_entities = [(span.text, span.label_) for span in (watchlist.merge(doc) if entities else watchlist.spans(doc))]
+        else:
+            doc_entities = entities_from_doc(doc) if entities else []
+        yield doc_entities, relationships_from_doc(doc) if relationships else []
+
+def extract_all_cached(texts, cache, batch_size=DEFAULT_BATCH_SIZE, n_process=1, statistical=True, watchlist=None):
+    """
+    Like extract_all, but only parses texts missing from the cache.
+
+    Returns:
+    - A list of (entities, relationships), one per text, in input order.
+    """
+    if statistical:
+        nlp, _ = get_pipeline()
+        model_name, model_version = f"{nlp.meta['lang']}_{nlp.meta['name']}", nlp.meta["version"]
+    else:
+        model_name, model_version = "tokenizer", spacy.__version__
+    if watchlist is not None:
+        # Results depend on the watchlist too
+        model_name = f"{model_name}+watchlist:{watchlist.fingerprint}"
+    keys = [cache.key(text, model_name, model_version) for text in texts]
+    results = cache.get_many(set(keys))
+
+    # Parse each distinct uncached text once
+    pending = {}
+    for key, text in zip(keys, texts):
+        if key not in results:
+            pending.setdefault(key, text)
+    if pending:
+        parsed = dict(zip(pending, extract_all(pending.values(), batch_size=batch_size, n_process=n_process,
+                                               entities=statistical, relationships=statistical, watchlist=watchlist)))
+        cache.put_many(parsed)
+        results.update(parsed)
+
+    return [results[key] for key in keys]
+
 # Main function to process the data
-def process_data(input_file, output_file):
+def process_data(input_file, output_file, workers=1, batch_size=DEFAULT_BATCH_SIZE, cache_dir=DEFAULT_CACHE_DIR,
+                 excel_output=None, entity_index=None, watchlist=None, statistical=True):
+    """
+    Extract entities and relationships for every row and save them as Parquet to output_file.
+
+    The input (an Excel, CSV or Parquet path or uploaded file) is streamed in row batches,
+    and each batch is written as soon as it is processed. Rows whose text was already parsed
+    by the same model are read from the on-disk cache in cache_dir; pass cache_dir=None to
+    always parse. When excel_output is given, the results are also exported there as an
+    Excel workbook. When entity_index (an EntityIndex) is given, each batch is added to it
+    as soon as it is extracted.
+
+    When a watchlist is given, its hits are merged into the entities. With
+    statistical=False only the watchlist runs: rows are tokenized but not parsed, and no
+    relationships are extracted.
+
+    Errors are printed and re-raised, so callers never mistake a partial output_file
+    for a complete one.
+
+    Returns:
+    - The number of rows written.
+    """
+    cache = None
+    rows = 0
     try:
-        dataframe = pd.read_excel(input_file, usecols=[1])
-        dataframe["Text"] = dataframe["Text"].fillna("")  # Handle missing values
-        dataframe["entities"] = dataframe["Text"].apply(extract_entities)
-        dataframe["relationships"] = dataframe["Text"].apply(extract_relationships)
-        dataframe.to_excel(output_file, index=False)
+        cache = ExtractionCache(cache_dir) if cache_dir is not None else None
+        with open_processed_writer(output_file) as writer, stage("extract", rows=0) as run:
+            for batch in iter_row_batches(input_file):
+                run.rows += len(batch)
+                rows += len(batch)
+                dataframe = batch[["Text"]].copy()
+                dataframe["Text"] = dataframe["Text"].fillna("").astype(str)  # Handle missing values
+                texts = dataframe["Text"].tolist()
+                if cache is None:
+                    results = list(extract_all(texts, batch_size=batch_size, n_process=workers,
+                                               entities=statistical, relationships=statistical, watchlist=watchlist))
+                else:
+                    results = extract_all_cached(texts, cache, batch_size=batch_size, n_process=workers,
+                                                 statistical=statistical, watchlist=watchlist)
+                dataframe["entities"] = [entities for entities, _ in results]
+                dataframe["relationships"] = [relationships for _, relationships in results]
+                writer.write_table(to_table(dataframe))
+                if entity_index is not None:
+                    entity_index.add_dataframe(dataframe)
+        if excel_output:
+            with stage("export"):
+                load_processed(output_file).to_excel(excel_output, index=False)
         print(f"Data successfully processed and saved to {output_file}")
     except Exception as e:
         print(f"Error processing data: {e}")
+        raise
+    finally:
+        if cache is not None:
+            cache.close()
+    return rows
 
 # Test the functions
 if __name__ == "__main__":
     input_file = "sample_input.xlsx"  # Your input file path
-    output_file = "output_file.xlsx"  # Your desired output file path
+    output_file = "output_file.parquet"  # Your desired output file path
     process_data(input_file, output_file)
-
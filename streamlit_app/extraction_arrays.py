@@ -0,0 +1,219 @@
+# extraction_arrays.py
+
+import json
+import os
+
+import numpy as np
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from generate_insights import ExtractionCounter
+from processed_store import ENTITY_FIELDS, RELATIONSHIP_FIELDS
+from vocabulary import Vocabulary
+
+ENTITY_ARRAYS = ("entity_row", "entity_text", "entity_label")
+RELATIONSHIP_ARRAYS = ("relationship_row", "relationship_subject", "relationship_verb", "relationship_object")
+
+class PackedStrings:
+    """
+    A saved vocabulary: UTF-8 bytes and offsets, decoded one string at a time on access.
+
+    Both arrays can be memory-mapped, so opening a saved result does not read or
+    decode strings that are never looked at.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def pack(cls, strings):
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, code):
+        return self.data[self.offsets[code]:self.offsets[code + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return (self[code] for code in range(len(self)))
+
+class ExtractionArrays:
+    """
+    Extraction results of a whole dataset as parallel int32 arrays.
+
+    Every entity text, label, subject, verb and object is interned once in a shared
+    vocabulary; an entity mention is then (row, text code, label code) and a
+    relationship (row, subject code, verb code, object code), each column a NumPy
+    array. Filtering, cleaning and counting work on whole arrays instead of per-row
+    lists of tuples, and a saved result is memory-mapped back without copying.
+
+    The processed data keeps no character offsets, so mentions carry no start/end.
+    """
+
+    def __init__(self, strings, num_rows, entity_row, entity_text, entity_label,
+                 relationship_row, relationship_subject, relationship_verb, relationship_object):
+        self.strings = strings
+        self.num_rows = num_rows
+        self.entity_row = entity_row
+        self.entity_text = entity_text
+        self.entity_label = entity_label
+        self.relationship_row = relationship_row
+        self.relationship_subject = relationship_subject
+        self.relationship_verb = relationship_verb
+        self.relationship_object = relationship_object
+        self._blank = None
+
+    @classmethod
+    def from_rows(cls, entity_rows, relationship_rows):
+        """Build from per-row lists of (text, label) and (subject, verb, object) tuples."""
+        vocabulary = Vocabulary()
+        entity_columns = ([], [], [])
+        relationship_columns = ([], [], [], [])
+        num_rows = 0
+        for row, (entities, relationships) in enumerate(zip(entity_rows, relationship_rows)):
+            num_rows += 1
+            for text, label in entities:
+                for column, value in zip(entity_columns, (row, vocabulary.code(text), vocabulary.code(label))):
+                    column.append(value)
+            for subject, verb, object_ in relationships:
+                codes = (row, vocabulary.code(subject), vocabulary.code(verb), vocabulary.code(object_))
+                for column, value in zip(relationship_columns, codes):
+                    column.append(value)
+        return cls(vocabulary.values, num_rows,
+                   *(np.array(column, dtype=np.int32) for column in entity_columns + relationship_columns))
+
+    @classmethod
+    def from_dataframe(cls, dataframe):
+        return cls.from_rows(dataframe["entities"], dataframe["relationships"])
+
+    @classmethod
+    def from_processed(cls, path):
+        """
+        Build straight from a processed Parquet file, without creating a tuple per mention.
+
+        Each field is dictionary-encoded by Arrow, so only its distinct strings are
+        interned in Python; the codes themselves are remapped as whole arrays.
+        """
+        table = pq.read_table(path, columns=["entities", "relationships"], memory_map=True)
+        vocabulary = Vocabulary()
+        arrays = []
+        for column, fields in (("entities", ENTITY_FIELDS), ("relationships", RELATIONSHIP_FIELDS)):
+            lists = table.column(column).combine_chunks()
+            arrays.append(pc.list_parent_indices(lists).to_numpy().astype(np.int32))
+            values = lists.flatten()
+            for field in fields:
+                encoded = pc.dictionary_encode(pc.fill_null(values.field(field), ""))
+                mapping = vocabulary.codes_for(encoded.dictionary.to_pylist())
+                arrays.append(mapping[encoded.indices.to_numpy()] if len(mapping) else np.zeros(0, dtype=np.int32))
+        return cls(vocabulary.values, table.num_rows, *arrays)
+
+    def __repr__(self):
+        return (f"ExtractionArrays({self.num_rows} rows, {len(self.entity_row)} entities, "
+                f"{len(self.relationship_row)} relationships, {len(self.strings)} strings)")
+
+    # Filtering and cleaning
+
+    def blank(self):
+        """Boolean array over the vocabulary: True where the string is empty or whitespace."""
+        if self._blank is None:
+            self._blank = np.fromiter((not string.strip() for string in self.strings), dtype=bool,
+                                      count=len(self.strings))
+        return self._blank
+
+    def filter(self, entity_mask=None, relationship_mask=None):
+        """Keep the entities and relationships where the masks are True (all of them where a mask is None)."""
+        entities = [getattr(self, name) for name in ENTITY_ARRAYS]
+        relationships = [getattr(self, name) for name in RELATIONSHIP_ARRAYS]
+        if entity_mask is not None:
+            entities = [array[entity_mask] for array in entities]
+        if relationship_mask is not None:
+            relationships = [array[relationship_mask] for array in relationships]
+        filtered = ExtractionArrays(self.strings, self.num_rows, *entities, *relationships)
+        filtered._blank = self._blank
+        return filtered
+
+    def valid_entities(self):
+        """Mask of entities with non-empty text and label."""
+        blank = self.blank()
+        return ~blank[self.entity_text] & ~blank[self.entity_label]
+
+    def valid_relationships(self):
+        """Mask of relationships with non-empty subject and object."""
+        blank = self.blank()
+        return ~blank[self.relationship_subject] & ~blank[self.relationship_object]
+
+    def clean(self):
+        """Drop entities with empty text or label and relationships with an empty subject or object."""
+        return self.filter(self.valid_entities(), self.valid_relationships())
+
+    def with_labels(self, labels):
+        """Keep only the entities with one of labels (relationships are unchanged)."""
+        labels = set(labels)
+        codes = [code for code, string in enumerate(self.strings) if string in labels]
+        return self.filter(entity_mask=np.isin(self.entity_label, codes))
+
+    # Counting
+
+    def _count(self, columns):
+        """Distinct combinations of the code columns with their counts, in first-seen order."""
+        if len(columns[0]) == 0:
+            return np.zeros((0, len(columns)), dtype=np.int32), np.zeros(0, dtype=np.int64)
+        size = max(len(self.strings), 1)
+        if size ** len(columns) < 2 ** 63:
+            keys = np.zeros(len(columns[0]), dtype=np.int64)
+            for column in columns:
+                keys = keys * size + column
+            _, first, counts = np.unique(keys, return_index=True, return_counts=True)
+        else:
+            _, first, counts = np.unique(np.stack(columns, axis=1), axis=0, return_index=True, return_counts=True)
+        order = np.argsort(first, kind="stable")
+        return np.stack([column[first[order]] for column in columns], axis=1), counts[order]
+
+    def _counter(self, columns):
+        codes, counts = self._count(columns)
+        strings = self.strings
+        items = [tuple(strings[code] for code in row) for row in codes.tolist()]
+        return ExtractionCounter.from_counts(items, counts.tolist())
+
+    def entity_counts(self):
+        """Mentions per (text, label), as an ExtractionCounter."""
+        return self._counter([self.entity_text, self.entity_label])
+
+    def relationship_counts(self):
+        """Mentions per (subject, verb, object), as an ExtractionCounter."""
+        return self._counter([self.relationship_subject, self.relationship_verb, self.relationship_object])
+
+    def relationship_tuples(self):
+        """All relationships as (subject, verb, object) string tuples, e.g. for building a graph."""
+        strings = np.array(list(self.strings), dtype=object)
+        return list(zip(strings[self.relationship_subject], strings[self.relationship_verb],
+                        strings[self.relationship_object]))
+
+    # Persistence
+
+    def save(self, directory):
+        """Write one .npy file per array plus the packed vocabulary to directory."""
+        os.makedirs(directory, exist_ok=True)
+        strings = self.strings if isinstance(self.strings, PackedStrings) else PackedStrings.pack(self.strings)
+        np.save(os.path.join(directory, "strings.npy"), strings.data)
+        np.save(os.path.join(directory, "string_offsets.npy"), strings.offsets)
+        for name in ENTITY_ARRAYS + RELATIONSHIP_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"num_rows": self.num_rows}, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """Open a saved result; with mmap_mode="r" the arrays are memory-mapped, not read."""
+        def load_array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        with open(os.path.join(directory, "meta.json")) as f:
+            num_rows = json.load(f)["num_rows"]
+        strings = PackedStrings(load_array("strings"), load_array("string_offsets"))
+        return cls(strings, num_rows, *(load_array(name) for name in ENTITY_ARRAYS + RELATIONSHIP_ARRAYS))
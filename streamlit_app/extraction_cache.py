@@ -0,0 +1,127 @@
+# extraction_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_CACHE_DIR = os.environ.get("TEAM3000_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "team3000"))
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# SQLite limits the number of bound parameters per statement
+QUERY_CHUNK_SIZE = 500
+# Seconds to wait for another process (e.g. a batch worker) to release the write lock
+LOCK_TIMEOUT = 60
+
+class ExtractionCache:
+    """
+    Content-addressed SQLite cache of per-row extraction results.
+
+    Keys hash the row text together with the spaCy model name and version, so upgrading
+    the model invalidates old entries. Once the stored results exceed max_bytes, the
+    least recently used entries are evicted.
+
+    The total size is kept in the one-row extraction_stats table, updated by triggers
+    as entries are written and deleted, so checking the budget does not scan the cache.
+    Several processes may share one cache file.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(os.path.join(cache_dir, "extractions.sqlite3"), timeout=LOCK_TIMEOUT)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # Set up the schema in one write transaction, so the total is counted exactly once
+        self.connection.execute("BEGIN IMMEDIATE")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS extractions_last_access ON extractions (last_access)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS extraction_stats (id INTEGER PRIMARY KEY CHECK (id = 1), total_size INTEGER NOT NULL)"
+        )
+        # Caches created before the total was tracked are counted once here
+        self.connection.execute(
+            "INSERT OR IGNORE INTO extraction_stats (id, total_size) SELECT 1, COALESCE(SUM(size), 0) FROM extractions"
+        )
+        for trigger, event, change in (
+            ("extractions_insert", "INSERT", "NEW.size"),
+            ("extractions_delete", "DELETE", "-OLD.size"),
+            ("extractions_update", "UPDATE OF size", "NEW.size - OLD.size"),
+        ):
+            self.connection.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {trigger} AFTER {event} ON extractions BEGIN "
+                f"UPDATE extraction_stats SET total_size = total_size + {change} WHERE id = 1; END"
+            )
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def key(text, model_name, model_version):
+        digest = hashlib.sha256()
+        for part in (model_name, model_version, text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_many(self, keys):
+        """Return {key: (entities, relationships)} for the keys present, marking them as used."""
+        keys = list(keys)
+        found = {}
+        now = time.time()
+        for start in range(0, len(keys), QUERY_CHUNK_SIZE):
+            chunk = keys[start:start + QUERY_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT key, value FROM extractions WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, value in rows:
+                entities, relationships = json.loads(value)
+                found[key] = ([tuple(entity) for entity in entities], [tuple(rel) for rel in relationships])
+            self.connection.execute(
+                f"UPDATE extractions SET last_access = ? WHERE key IN ({placeholders})", [now, *chunk]
+            )
+        self.connection.commit()
+        return found
+
+    def put_many(self, items):
+        """Store {key: (entities, relationships)} and evict old entries if over budget."""
+        now = time.time()
+        rows = []
+        for key, result in items.items():
+            value = json.dumps(result)
+            rows.append((key, value, len(value), now))
+        # An upsert rather than INSERT OR REPLACE, whose implicit deletes would skip the size trigger
+        self.connection.executemany(
+            "INSERT INTO extractions (key, value, size, last_access) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+            "last_access = excluded.last_access",
+            rows,
+        )
+        self.connection.commit()
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the total size fits within max_bytes."""
+        total = self.connection.execute("SELECT total_size FROM extraction_stats").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        stale = []
+        for key, size in self.connection.execute("SELECT key, size FROM extractions ORDER BY last_access"):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.connection.executemany("DELETE FROM extractions WHERE key = ?", stale)
+        self.connection.commit()
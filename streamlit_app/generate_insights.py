@@ -1,12 +1,189 @@
+import heapq
+from array import array
 from collections import Counter
 
-def generate_insights(dataframe):
-    # Count entities
-    all_entities = [entity for sublist in dataframe["entities"] for entity in sublist]
-    entity_counts = Counter(all_entities)
+class ExtractionCounter:
+    """
+    Exact counts of extracted items, fed one row at a time.
 
-    # Count relationships
-    all_relationships = [rel for sublist in dataframe["relationships"] for rel in sublist]
-    relationship_counts = Counter(all_relationships)
+    Each distinct entity or relationship is interned once and given an integer code;
+    counts live in a compact integer array indexed by that code, so no flattened list
+    of every extraction is ever built. Counters from different workers can be merged.
+    """
 
-    return entity_counts, relationship_counts
\ No newline at end of file
+    def __init__(self):
+        self.codes = {}          # item -> code
+        self.items = []          # code -> item
+        self.counts = array("q")  # code -> count
+
+    @classmethod
+    def from_counts(cls, items, counts):
+        """Build from distinct items and their counts, e.g. counted elsewhere in bulk."""
+        counter = cls()
+        counter.items = list(items)
+        counter.codes = {item: code for code, item in enumerate(counter.items)}
+        counter.counts = array("q", counts)
+        return counter
+
+    def update(self, items):
+        codes, counts = self.codes, self.counts
+        for item in items:
+            code = codes.get(item)
+            if code is None:
+                codes[item] = len(self.items)
+                self.items.append(item)
+                counts.append(1)
+            else:
+                counts[code] += 1
+
+    def add(self, item, count=1):
+        code = self.codes.get(item)
+        if code is None:
+            self.codes[item] = len(self.items)
+            self.items.append(item)
+            self.counts.append(count)
+        else:
+            self.counts[code] += count
+
+    def merge(self, other):
+        """Add another counter's counts into this one."""
+        for item, count in zip(other.items, other.counts):
+            self.add(item, count)
+        return self
+
+    def __len__(self):
+        return len(self.items)
+
+    def most_common(self, n=None):
+        pairs = zip(self.items, self.counts)
+        if n is None:
+            return sorted(pairs, key=lambda pair: pair[1], reverse=True)
+        return heapq.nlargest(n, pairs, key=lambda pair: pair[1])
+
+    def to_counter(self):
+        return Counter(dict(zip(self.items, self.counts)))
+
+class SpaceSavingCounter:
+    """
+    Approximate top-k counts in bounded memory (the Space-Saving algorithm).
+
+    At most capacity items are tracked. When a new item arrives and the summary is
+    full, it replaces the item with the smallest count and inherits that count, which
+    is remembered as its maximum overestimate. Any item seen more than
+    total / capacity times is guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}   # item -> estimated count
+        self.errors = {}   # item -> maximum overestimate
+        self.total = 0
+        self._heap = []    # (count, item), with stale entries skipped lazily
+
+    def _minimum(self):
+        while True:
+            count, item = self._heap[0]
+            if self.counts.get(item) == count:
+                return count, item
+            heapq.heappop(self._heap)
+
+    def _push(self, item, count):
+        heapq.heappush(self._heap, (count, item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c, i) for i, c in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def add(self, item, count=1, error=0):
+        self.total += count
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = error
+        else:
+            minimum, evicted = self._minimum()
+            heapq.heappop(self._heap)
+            del self.counts[evicted], self.errors[evicted]
+            self.counts[item] = minimum + count
+            self.errors[item] = minimum + error
+        self._push(item, self.counts[item])
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def merge(self, other):
+        """Fold another summary into this one; the result has the same error guarantee."""
+        self_floor = self._minimum()[0] if len(self.counts) >= self.capacity else 0
+        other_floor = other._minimum()[0] if len(other.counts) >= other.capacity else 0
+        combined = {}
+        for item in self.counts.keys() | other.counts.keys():
+            count = self.counts.get(item, self_floor) + other.counts.get(item, other_floor)
+            error = self.errors.get(item, self_floor) + other.errors.get(item, other_floor)
+            combined[item] = (count, error)
+
+        kept = heapq.nlargest(self.capacity, combined.items(), key=lambda pair: pair[1][0])
+        self.counts = {item: count for item, (count, _) in kept}
+        self.errors = {item: error for item, (_, error) in kept}
+        self.total += other.total
+        self._heap = [(count, item) for item, count in self.counts.items()]
+        heapq.heapify(self._heap)
+        return self
+
+    def __len__(self):
+        return len(self.counts)
+
+    def most_common(self, n=None):
+        ranked = sorted(self.counts.items(), key=lambda pair: pair[1], reverse=True)
+        return ranked if n is None else ranked[:n]
+
+    def to_counter(self):
+        return Counter(dict(self.most_common()))
+
+def new_counter(capacity=None):
+    """An exact counter, or a bounded Space-Saving summary when capacity is given."""
+    return ExtractionCounter() if capacity is None else SpaceSavingCounter(capacity)
+
+def count_extractions(entity_rows, relationship_rows, capacity=None, entity_filter=None, relationship_filter=None):
+    """
+    Aggregate per-row extraction output in a single streaming pass.
+
+    Parameters:
+    - entity_rows, relationship_rows (iterables of lists): One list per row, e.g. the
+      'entities' and 'relationships' columns of the processed data.
+    - capacity (int, optional): Track at most this many items per counter (approximate).
+    - entity_filter, relationship_filter (callables, optional): Count only items for
+      which these return True.
+
+    Returns:
+    - (entity_counter, relationship_counter), mergeable with counters from other workers.
+    """
+    entity_counter, relationship_counter = new_counter(capacity), new_counter(capacity)
+    for entities, relationships in zip(entity_rows, relationship_rows):
+        entity_counter.update(entities if entity_filter is None else filter(entity_filter, entities))
+        relationship_counter.update(relationships if relationship_filter is None else filter(relationship_filter, relationships))
+    return entity_counter, relationship_counter
+
+def generate_insights(dataframe, capacity=None, entity_filter=None, relationship_filter=None):
+    """
+    Count entities and relationships.
+
+    Parameters:
+    - dataframe (pd.DataFrame or ExtractionArrays): Processed data. ExtractionArrays are
+      counted in bulk over their code arrays (capacity and the filters do not apply; use
+      ExtractionArrays.clean / filter first).
+
+    Returns:
+    - (entity_counts, relationship_counts) as Counters.
+    """
+    if hasattr(dataframe, "entity_counts"):
+        return dataframe.entity_counts().to_counter(), dataframe.relationship_counts().to_counter()
+
+    # Count entities and relationships row by row instead of flattening them first
+    entity_counter, relationship_counter = count_extractions(
+        dataframe["entities"], dataframe["relationships"], capacity, entity_filter, relationship_filter
+    )
+    entity_counts = entity_counter.to_counter()
+    relationship_counts = relationship_counter.to_counter()
+
+    return entity_counts, relationship_counts
@@ -0,0 +1,147 @@
+# ingest.py
+
+import hashlib
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+try:
+    from python_calamine import CalamineWorkbook  # Optional, much faster Excel reader
+except ImportError:
+    CalamineWorkbook = None
+
+DEFAULT_BATCH_ROWS = 10000
+SUPPORTED_FORMATS = ("xlsx", "csv", "parquet")
+
+def content_hash(path, chunk_size=1 << 20):
+    """Return the hex SHA-256 digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def detect_format(source):
+    """Infer the file format from a path or an uploaded file's name."""
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", "")
+    extension = os.path.splitext(str(name))[1].lower().lstrip(".")
+    if extension == "xls":
+        # openpyxl only reads .xlsx; the legacy format needs the optional calamine reader
+        if CalamineWorkbook is None:
+            raise ValueError("Reading .xls files requires the python-calamine package; "
+                             "install it or save the workbook as .xlsx.")
+        return "xlsx"
+    if extension not in SUPPORTED_FORMATS:
+        raise ValueError(f"Unsupported file type: '{extension}'. Expected one of {', '.join(SUPPORTED_FORMATS)}.")
+    return extension
+
+def _iter_sheet_rows(source):
+    """Yield the rows of the first worksheet as tuples, header first."""
+    if CalamineWorkbook is not None:
+        if isinstance(source, (str, os.PathLike)):
+            workbook = CalamineWorkbook.from_path(str(source))
+        else:
+            workbook = CalamineWorkbook.from_filelike(source)
+        # calamine returns "" for empty cells where openpyxl returns None; match openpyxl so
+        # blank cells are seen as missing values whichever reader is installed
+        for row in workbook.get_sheet_by_index(0).iter_rows():
+            yield tuple(None if value == "" else value for value in row)
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+def _iter_excel_batches(source, batch_size):
+    rows = _iter_sheet_rows(source)
+    header = next(rows, None)
+    if header is None:
+        return
+    # Match pandas' names for blank header cells
+    columns = [name if name not in (None, "") else f"Unnamed: {k}" for k, name in enumerate(header)]
+
+    batch = []
+    start = 0
+    blank_rows = 0
+    for row in rows:
+        # Like pd.read_excel, keep blank rows between data rows but drop trailing ones
+        if all(value is None or value == "" for value in row):
+            blank_rows += 1
+            continue
+        for pending_row in [(None,) * len(columns)] * blank_rows + [row]:
+            batch.append(pending_row)
+            if len(batch) == batch_size:
+                yield pd.DataFrame(batch, columns=columns, index=pd.RangeIndex(start, start + len(batch)))
+                start += len(batch)
+                batch = []
+        blank_rows = 0
+    if batch:
+        yield pd.DataFrame(batch, columns=columns, index=pd.RangeIndex(start, start + len(batch)))
+
+def _iter_parquet_batches(source, batch_size):
+    start = 0
+    for record_batch in pq.ParquetFile(source).iter_batches(batch_size=batch_size):
+        batch = record_batch.to_pandas()
+        batch.index = pd.RangeIndex(start, start + len(batch))
+        start += len(batch)
+        yield batch
+
+def iter_row_batches(source, batch_size=DEFAULT_BATCH_ROWS):
+    """
+    Stream a workbook, CSV or Parquet file as DataFrames of at most batch_size rows.
+
+    Parameters:
+    - source: A file path, or a file-like object with a 'name' (such as a Streamlit upload).
+    - batch_size (int): Maximum number of rows per batch.
+
+    Yields:
+    - pd.DataFrame batches whose index continues across batches, so index + 2 is still
+      the spreadsheet row number.
+    """
+    file_format = detect_format(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+    if file_format == "xlsx":
+        yield from _iter_excel_batches(source, batch_size)
+    elif file_format == "csv":
+        yield from pd.read_csv(source, chunksize=batch_size)
+    else:
+        yield from _iter_parquet_batches(source, batch_size)
+
+def count_rows(source):
+    """
+    Return the number of data rows without parsing cell values, or None if unknown.
+
+    Excel counts come from the sheet's stored dimensions and may include trailing blank rows.
+    """
+    file_format = detect_format(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+    if file_format == "parquet":
+        return pq.ParquetFile(source).metadata.num_rows
+    if file_format == "csv":
+        if not isinstance(source, (str, os.PathLike)):
+            return None
+        with open(source, "rb") as f:
+            return max(sum(1 for _ in f) - 1, 0)
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(source, read_only=True)
+    try:
+        max_row = workbook.worksheets[0].max_row
+    finally:
+        workbook.close()
+    return max_row - 1 if max_row else None
+
+def read_table(source, batch_size=DEFAULT_BATCH_ROWS):
+    """Read a whole file through iter_row_batches, for stages that need every row at once."""
+    batches = list(iter_row_batches(source, batch_size))
+    if not batches:
+        return pd.DataFrame()
+    return pd.concat(batches)
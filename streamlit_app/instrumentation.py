@@ -0,0 +1,225 @@
+# instrumentation.py
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Set TEAM3000_PROFILE to "cprofile" or "pyinstrument" to dump a profile of each run
+PROFILE_MODE = os.environ.get("TEAM3000_PROFILE", "").lower()
+PROFILE_DIR = os.environ.get("TEAM3000_PROFILE_DIR", "profiles")
+
+METRIC_PREFIX = "team3000"
+
+# Stage name -> accumulated timings, rows and memory, for this process
+_stats = {}
+_lock = threading.Lock()
+
+# Stage name -> hits and misses of its memoized result, and the stages recomputed in this thread
+_cache_stats = {}
+_computed = threading.local()
+
+def current_rss_bytes():
+    """Resident set size of this process, falling back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return peak_rss_bytes()
+
+def peak_rss_bytes():
+    """High-water mark of this process' resident set size (0 where it cannot be read, e.g. Windows)."""
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class StageRun:
+    """Handle yielded by stage(); set rows once the number of rows handled is known."""
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+def record(name, seconds, rows=None, rss_delta_bytes=0, peak_bytes=None):
+    """Add one run of a stage to the statistics."""
+    with _lock:
+        stats = _stats.setdefault(name, {
+            "calls": 0, "seconds_total": 0.0, "rows_total": 0,
+            "last_seconds": 0.0, "last_rows": None, "last_rss_delta_bytes": 0, "peak_rss_bytes": 0,
+        })
+        stats["calls"] += 1
+        stats["seconds_total"] += seconds
+        stats["rows_total"] += rows or 0
+        stats["last_seconds"] = seconds
+        stats["last_rows"] = rows
+        stats["last_rss_delta_bytes"] = rss_delta_bytes
+        stats["peak_rss_bytes"] = max(stats["peak_rss_bytes"], peak_bytes or 0)
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    Time a pipeline stage and record its memory use and row throughput.
+
+    Usage:
+        with stage("extract") as run:
+            ...
+            run.rows = len(dataframe)
+    """
+    run = StageRun(name, rows)
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield run
+    finally:
+        seconds = time.perf_counter() - start
+        record(name, seconds, run.rows, current_rss_bytes() - rss_before, peak_rss_bytes())
+
+def snapshot():
+    """Return a copy of the statistics, {stage: stats}."""
+    with _lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+def merge(other):
+    """Fold a snapshot taken in another process (e.g. a job worker) into this one's statistics."""
+    with _lock:
+        for name, theirs in other.items():
+            ours = _stats.get(name)
+            if ours is None:
+                _stats[name] = dict(theirs)
+                continue
+            for key in ("calls", "seconds_total", "rows_total"):
+                ours[key] += theirs[key]
+            for key in ("last_seconds", "last_rows", "last_rss_delta_bytes"):
+                ours[key] = theirs[key]
+            ours["peak_rss_bytes"] = max(ours["peak_rss_bytes"], theirs["peak_rss_bytes"])
+
+def _computed_stages():
+    names = getattr(_computed, "names", None)
+    if names is None:
+        names = _computed.names = set()
+    return names
+
+def cache_miss(name):
+    """
+    Mark a memoized stage as recomputed.
+
+    Call this first thing in the body of a cached function (st.cache_data,
+    st.cache_resource, ...): the body only runs when the cache missed.
+    """
+    _computed_stages().add(name)
+
+@contextmanager
+def cached_stage(name):
+    """
+    Count whether the memoized stage called inside was served from its cache.
+
+    Usage:
+        with cached_stage("topics"):
+            topics = get_topics(key, ...)  # Calls cache_miss("topics") when it runs
+    """
+    computed = _computed_stages()
+    computed.discard(name)
+    yield
+    hit = name not in computed
+    with _lock:
+        stats = _cache_stats.setdefault(name, {"hits": 0, "misses": 0, "last": None})
+        stats["hits" if hit else "misses"] += 1
+        stats["last"] = "hit" if hit else "miss"
+
+def cache_table():
+    """One row per memoized stage with its latest lookup and hit/miss totals, for display."""
+    with _lock:
+        return [
+            {"Stage": name, "Last": stats["last"], "Hits": stats["hits"], "Misses": stats["misses"]}
+            for name, stats in _cache_stats.items()
+        ]
+
+def performance_table(stats=None):
+    """One row per stage with its last run and totals, for display."""
+    rows = []
+    for name, values in (stats if stats is not None else snapshot()).items():
+        last_rows = values["last_rows"]
+        rows.append({
+            "Stage": name,
+            "Last (s)": round(values["last_seconds"], 3),
+            "Rows": last_rows,
+            "Rows/s": round(last_rows / values["last_seconds"]) if last_rows and values["last_seconds"] else None,
+            "RSS change (MB)": round(values["last_rss_delta_bytes"] / 2**20, 1),
+            "Peak RSS (MB)": round(values["peak_rss_bytes"] / 2**20, 1),
+            "Runs": values["calls"],
+            "Total (s)": round(values["seconds_total"], 3),
+        })
+    return rows
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def prometheus_text(stats=None):
+    """Render the statistics in the Prometheus text exposition format."""
+    stats = stats if stats is not None else snapshot()
+    metrics = (
+        ("stage_calls_total", "counter", "Number of times each stage ran.", "calls"),
+        ("stage_seconds_total", "counter", "Total time spent in each stage.", "seconds_total"),
+        ("stage_rows_total", "counter", "Total rows handled by each stage.", "rows_total"),
+        ("stage_last_seconds", "gauge", "Duration of the latest run of each stage.", "last_seconds"),
+        ("stage_peak_rss_bytes", "gauge", "Process RSS high-water mark at the end of each stage.", "peak_rss_bytes"),
+    )
+    lines = []
+    for metric, kind, description, key in metrics:
+        name = f"{METRIC_PREFIX}_{metric}"
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for stage_name, values in sorted(stats.items()):
+            lines.append(f'{name}{{stage="{_escape_label(stage_name)}"}} {values[key]}')
+    name = f"{METRIC_PREFIX}_process_peak_rss_bytes"
+    lines.append(f"# HELP {name} RSS high-water mark of the serving process.")
+    lines.append(f"# TYPE {name} gauge")
+    lines.append(f"{name} {peak_rss_bytes()}")
+    return "\n".join(lines) + "\n"
+
+@contextmanager
+def profile_run(name):
+    """
+    Profile the enclosed code when TEAM3000_PROFILE is set, writing the result to PROFILE_DIR.
+
+    "cprofile" writes a .prof file for pstats/snakeviz; "pyinstrument" (if installed)
+    writes an HTML report. Does nothing when the variable is unset.
+    """
+    if PROFILE_MODE not in ("cprofile", "pyinstrument"):
+        yield None
+        return
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+    if PROFILE_MODE == "pyinstrument":
+        try:
+            from pyinstrument import Profiler  # Optional dependency
+        except ImportError:
+            Profiler = None
+        if Profiler is not None:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield f"{path}.html"
+            finally:
+                profiler.stop()
+                with open(f"{path}.html", "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+            return
+
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield f"{path}.prof"
+    finally:
+        profiler.disable()
+        profiler.dump_stats(f"{path}.prof")
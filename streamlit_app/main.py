@@ -1,59 +1,237 @@
-import pandas as pd
-import ast
+"""
+Run the pipeline over many workbooks without the dashboard.
+
+Usage:
+    python main.py INPUT [INPUT ...] [--output-dir batch_output] [--workers N]
+
+Each input may be a workbook, a directory (searched recursively for Excel, CSV and
+Parquet files) or a glob pattern. Every file is validated, resolved, extracted,
+cleaned and topic-modelled in a pool of worker processes. Files are identified by
+the hash of their contents, so re-running skips files that were already processed, and
+a file interrupted part-way resumes from its last completed stage.
+
+Output directory layout:
+    manifest.json           Checkpoint: status and summary per input, keyed by content hash
+    processed/<hash>.parquet Extraction results of every input (one consolidated dataset)
+    work/<hash>/            Per-input stage outputs (resolved rows, cleaned extraction arrays, topics)
+    insights.txt            Top entities and relationships across all inputs
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from extract_entities_relationships import process_data
-from generate_insights import generate_insights
-
-# Function to clean relationships
-def clean_relationships(relationships):
-    cleaned_relationships = []
-    for rel in relationships:
-        subject, verb, object_ = rel
-        # Filter out relationships with empty subjects or objects
-        if subject.strip() and object_.strip():
-            cleaned_relationships.append((subject, verb, object_))
-        else:
-            print(f"Skipping invalid relationship: {rel}")
-    return cleaned_relationships
-
-def clean_entities(entities):
-    cleaned_entities = []
-    for pair in entities:
-        entity, label = pair
-        # Filter out relationships with empty subjects or objects
-        if entity.strip() and label.strip():
-            cleaned_entities.append((entity, label))
+from extraction_cache import DEFAULT_CACHE_DIR
+from processed_store import load_texts
+from generate_insights import new_counter
+from extraction_arrays import ExtractionArrays
+from ingest import content_hash, read_table, SUPPORTED_FORMATS
+from validate_data import build_validation_report, resolve_errors
+from topic_modeling import perform_lda_topic_modeling
+from nlp_models import preload, ENTITY_COMPONENTS, RELATIONSHIP_COMPONENTS
+
+DEFAULT_OUTPUT_DIR = "batch_output"
+
+def find_inputs(patterns):
+    """Expand files, directories and glob patterns into a sorted list of supported files."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = glob.glob(os.path.join(pattern, "**", "*"), recursive=True)
         else:
-            print(f"Skipping invalid relationship: {pair}")
-    return cleaned_entities
-
-# Process the data
-input_file = "excerpts_parsed.xlsx"
-output_file = "processed_excerpts.xlsx"
-process_data(input_file, output_file)
-
-# Load the processed data
-dataframe = pd.read_excel(output_file)
-
-# Convert string representations of lists back to actual lists
-dataframe["entities"] = dataframe["entities"].apply(ast.literal_eval)
-dataframe["relationships"] = dataframe["relationships"].apply(ast.literal_eval)
-
-# Flatten the relationships column
-all_entities = [ent for sublist in dataframe["entities"] for ent in sublist]
-all_relationships = [rel for sublist in dataframe["relationships"] for rel in sublist]
-
-# Clean the relationships
-cleaned_entities = clean_entities(all_entities)
-cleaned_relationships = clean_relationships(all_relationships)
-
-# Generate insights
-entity_counts, relationship_counts = generate_insights(dataframe)
-
-# Save insights to a file (optional)
-with open("insights.txt", "w") as f:
-    f.write("Top Entities:\n")
-    for entity, count in entity_counts.most_common(10):
-        f.write(f"{entity}: {count}\n")
-    f.write("\nTop Relationships:\n")
-    for relationship, count in relationship_counts.most_common(10):
-        f.write(f"{relationship}: {count}\n")
\ No newline at end of file
+            candidates = glob.glob(pattern, recursive=True) or [pattern]
+        for path in candidates:
+            extension = os.path.splitext(path)[1].lower().lstrip(".")
+            if os.path.isfile(path) and extension in SUPPORTED_FORMATS + ("xls",) and not os.path.basename(path).startswith("~$"):
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+def _write_atomically(path, write):
+    """Call write(tmp_path) and move the result into place, so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, "manifest.json")
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path) as f:
+        return json.load(f)
+
+def _write_json(path, value, **kwargs):
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(value, f, **kwargs)
+    _write_atomically(path, write)
+
+def save_manifest(output_dir, manifest):
+    _write_json(os.path.join(output_dir, "manifest.json"), manifest, indent=2)
+
+_watchlists = {}  # Loaded once per worker process
+
+def _get_watchlist(path):
+    if path is None:
+        return None
+    if path not in _watchlists:
+        from watchlist import Watchlist
+        _watchlists[path] = Watchlist.load(path) if path.endswith(".pkl") else Watchlist.from_table(path)
+    return _watchlists[path]
+
+def process_file(source, digest, output_dir, num_topics=5, cache_dir=DEFAULT_CACHE_DIR, watchlist_path=None,
+                 watchlist_only=False):
+    """
+    Run validate -> resolve -> extract -> clean -> topics for one input (in a worker process).
+
+    Each stage writes its output under work/<digest>/ (and processed/<digest>.parquet), and
+    is skipped when that output already exists, so an interrupted file resumes where it stopped.
+
+    Returns:
+    - A summary dict for the manifest.
+    """
+    work_dir = os.path.join(output_dir, "work", digest)
+    os.makedirs(work_dir, exist_ok=True)
+    summary = {"source": source}
+
+    # Validate and resolve
+    resolved_path = os.path.join(work_dir, "resolved.parquet")
+    if not os.path.exists(resolved_path):
+        df = read_table(source)
+        report = build_validation_report(df)
+        resolved, messages = resolve_errors(df, report)
+        # The summary goes first: the resolved rows mark the stage as complete
+        _write_json(os.path.join(work_dir, "validation.json"),
+                    {"rows": len(df), "errors": len(report.log), "resolved": messages})
+        _write_atomically(resolved_path, lambda tmp_path: resolved.to_parquet(tmp_path, index=False))
+    with open(os.path.join(work_dir, "validation.json")) as f:
+        summary.update(json.load(f))
+
+    # Extract
+    processed_path = os.path.join(output_dir, "processed", f"{digest}.parquet")
+    if not os.path.exists(processed_path):
+        tmp_path = os.path.join(work_dir, "processed.parquet")
+        process_data(resolved_path, tmp_path, cache_dir=cache_dir, watchlist=_get_watchlist(watchlist_path),
+                     statistical=not watchlist_only)
+        os.replace(tmp_path, processed_path)
+    dataframe = load_texts(processed_path)
+    summary["resolved_rows"] = len(dataframe)
+
+    # Clean: drop entities with empty text or labels and relationships with empty subjects or objects
+    extractions_path = os.path.join(work_dir, "extractions")
+    if not os.path.exists(extractions_path):
+        extractions = ExtractionArrays.from_processed(processed_path)
+        cleaned = extractions.clean()
+        print(f"Skipping {len(extractions.entity_row) - len(cleaned.entity_row)} invalid entities and "
+              f"{len(extractions.relationship_row) - len(cleaned.relationship_row)} invalid relationships")
+        cleaned.save(f"{extractions_path}.tmp")
+        os.replace(f"{extractions_path}.tmp", extractions_path)
+
+    # Topic model
+    topics_path = os.path.join(work_dir, "topics.json")
+    if not os.path.exists(topics_path):
+        try:
+            topics, _, _ = perform_lda_topic_modeling(dataframe, num_topics, n_jobs=1)
+            result = {"topics": [{"topic": topic, "words": words} for topic, words in topics]}
+        except ValueError as e:  # e.g. too little text to build a vocabulary
+            result = {"topics": None, "error": str(e)}
+        _write_json(topics_path, result)
+    with open(topics_path) as f:
+        summary["topics"] = json.load(f)["topics"]
+
+    return summary
+
+def write_insights(output_dir, manifest, top=10):
+    """Count the cleaned extractions of every completed input and write the overall top entries."""
+    entity_counts, relationship_counts = new_counter(), new_counter()
+    for digest, entry in manifest["files"].items():
+        if entry["status"] == "done":
+            extractions = ExtractionArrays.load(os.path.join(output_dir, "work", digest, "extractions"))
+            entity_counts.merge(extractions.entity_counts())
+            relationship_counts.merge(extractions.relationship_counts())
+
+    with open(os.path.join(output_dir, "insights.txt"), "w") as f:
+        f.write("Top Entities:\n")
+        for entity, count in entity_counts.most_common(top):
+            f.write(f"{entity}: {count}\n")
+        f.write("\nTop Relationships:\n")
+        for relationship, count in relationship_counts.most_common(top):
+            f.write(f"{relationship}: {count}\n")
+
+def run_batch(inputs, output_dir=DEFAULT_OUTPUT_DIR, workers=None, num_topics=5, cache_dir=DEFAULT_CACHE_DIR,
+              watchlist_path=None, watchlist_only=False, top=10):
+    """
+    Process every input not already in the manifest, in parallel, and write the consolidated insights.
+
+    Returns:
+    - The updated manifest.
+    """
+    os.makedirs(os.path.join(output_dir, "processed"), exist_ok=True)
+    manifest = load_manifest(output_dir)
+
+    pending = {}
+    for path in find_inputs(inputs):
+        digest = content_hash(path)
+        entry = manifest["files"].get(digest)
+        if entry is not None and entry["status"] == "done":
+            print(f"Skipping {path} (already processed as {digest[:12]})")
+        elif digest not in pending:
+            pending[digest] = path
+    print(f"{len(pending)} file(s) to process")
+
+    if pending:
+        # Load the model before forking so the workers share it copy-on-write
+        fork = "fork" in multiprocessing.get_all_start_methods()
+        if fork and not watchlist_only:
+            preload(components=ENTITY_COMPONENTS + RELATIONSHIP_COMPONENTS)
+        context = multiprocessing.get_context("fork") if fork else None
+
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(pending)), mp_context=context) as executor:
+            futures = {
+                executor.submit(process_file, path, digest, output_dir, num_topics, cache_dir, watchlist_path,
+                                watchlist_only): digest
+                for digest, path in pending.items()
+            }
+            for future in as_completed(futures):
+                digest = futures[future]
+                try:
+                    entry = {**future.result(), "status": "done"}
+                    print(f"Processed {entry['source']}")
+                except Exception as e:
+                    entry = {"source": pending[digest], "status": "failed", "error": str(e)}
+                    print(f"Failed {pending[digest]}: {e}")
+                entry["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+                manifest["files"][digest] = entry
+                # Checkpoint after every file so an interrupted run resumes from here
+                save_manifest(output_dir, manifest)
+
+    write_insights(output_dir, manifest, top)
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate, extract and summarize a batch of workbooks.")
+    parser.add_argument("inputs", nargs="*", default=["excerpts_parsed.xlsx"],
+                        help="Workbooks, directories or glob patterns (default: excerpts_parsed.xlsx).")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--topics", type=int, default=5, help="Number of LDA topics per file.")
+    parser.add_argument("--top", type=int, default=10, help="Entries per section of insights.txt.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Extraction cache directory.")
+    parser.add_argument("--no-cache", action="store_true", help="Always parse, ignoring the extraction cache.")
+    parser.add_argument("--watchlist", help="A saved watchlist (.pkl) or a table with term and label columns.")
+    parser.add_argument("--watchlist-only", action="store_true",
+                        help="Only match the watchlist, skipping the statistical model (requires --watchlist).")
+    args = parser.parse_args()
+    if args.watchlist_only and not args.watchlist:
+        parser.error("--watchlist-only requires --watchlist")
+
+    manifest = run_batch(
+        args.inputs, args.output_dir, args.workers, args.topics, None if args.no_cache else args.cache_dir,
+        os.path.abspath(args.watchlist) if args.watchlist else None, args.watchlist_only, args.top,
+    )
+    failed = [entry["source"] for entry in manifest["files"].values() if entry["status"] == "failed"]
+    if failed:
+        raise SystemExit(f"{len(failed)} file(s) failed: {', '.join(failed)}")
@@ -0,0 +1,207 @@
+# network_graph.py
+
+import heapq
+import math
+from collections import Counter, defaultdict
+
+import networkx as nx
+import numpy as np
+import plotly.graph_objects as go
+
+from lru import LRUCache
+
+# Components up to this size get a force-directed layout; larger ones a sparse spectral one
+SPRING_LAYOUT_MAX_NODES = 300
+# Defaults keeping the rendered network small enough for the browser
+DEFAULT_MAX_EDGES = 2000
+DEFAULT_LABELLED_NODES = 30
+
+# Weighted graphs per dataset and layouts per (dataset, pruning options), so reruns skip both
+MAX_CACHED_GRAPHS = 4
+_graph_cache = LRUCache(MAX_CACHED_GRAPHS)
+_layout_cache = LRUCache(MAX_CACHED_GRAPHS * 8)
+
+def build_relationship_graph(relationships):
+    """
+    Build an undirected graph linking each subject to its object.
+
+    Repeated (subject, object) pairs become a single edge whose 'weight' is the
+    number of times they were seen; 'label' is the pair's most frequent verb.
+    """
+    verbs = defaultdict(Counter)
+    for rel in relationships:
+        if isinstance(rel, tuple) and len(rel) == 3:
+            subject, verb, obj = rel
+            if subject != obj:
+                verbs[(subject, obj) if subject <= obj else (obj, subject)][verb] += 1
+
+    G = nx.Graph()
+    for (subject, obj), verb_counts in verbs.items():
+        G.add_edge(subject, obj, weight=sum(verb_counts.values()), label=verb_counts.most_common(1)[0][0])
+    return G
+
+def prune_graph(G, min_weight=1, min_degree=1, max_edges=None):
+    """
+    Keep the strongest part of a relationship graph.
+
+    Parameters:
+    - min_weight (int): Drop edges seen fewer times than this.
+    - min_degree (int): Then drop nodes with fewer remaining neighbours than this.
+    - max_edges (int, optional): Keep only this many edges, the most frequent first.
+    """
+    edges = [(u, v, data) for u, v, data in G.edges(data=True) if data["weight"] >= min_weight]
+    if max_edges is not None and len(edges) > max_edges:
+        edges = heapq.nlargest(max_edges, edges, key=lambda edge: edge[2]["weight"])
+
+    pruned = nx.Graph()
+    pruned.add_edges_from(edges)
+    if min_degree > 1:
+        pruned.remove_nodes_from([node for node, degree in pruned.degree() if degree < min_degree])
+        pruned.remove_nodes_from(list(nx.isolates(pruned)))
+    return pruned
+
+def collapse_communities(G, seed=42):
+    """
+    Replace each Louvain community with one node named after its best-connected member.
+
+    Community nodes carry a 'size' attribute; edges between communities are summed.
+    """
+    communities = nx.community.louvain_communities(G, weight="weight", seed=seed)
+    strength = dict(G.degree(weight="weight"))
+
+    community_of = {}
+    collapsed = nx.Graph()
+    for members in communities:
+        top_member = max(members, key=lambda node: strength[node])
+        name = top_member if len(members) == 1 else f"{top_member} (+{len(members) - 1})"
+        collapsed.add_node(name, size=len(members))
+        for node in members:
+            community_of[node] = name
+
+    for u, v, data in G.edges(data=True):
+        cu, cv = community_of[u], community_of[v]
+        if cu != cv:
+            if collapsed.has_edge(cu, cv):
+                collapsed[cu][cv]["weight"] += data["weight"]
+            else:
+                collapsed.add_edge(cu, cv, weight=data["weight"])
+    return collapsed
+
+def compute_layout(G, seed=42):
+    """
+    Position the nodes of G, one connected component at a time.
+
+    Small components use a seeded spring layout, large ones a spectral layout (sparse
+    eigensolver, so it scales with the number of edges rather than nodes squared).
+    Components are then packed in rows, largest first, scaled by their size.
+    """
+    components = sorted(nx.connected_components(G), key=len, reverse=True)
+    radii = [math.sqrt(len(nodes)) for nodes in components]
+    row_width = math.sqrt(sum((2 * r) ** 2 for r in radii)) * 1.2
+
+    positions = {}
+    x = y = row_height = 0.0
+    for nodes, radius in zip(components, radii):
+        subgraph = G.subgraph(nodes)
+        if len(nodes) == 1:
+            local = {node: np.zeros(2) for node in nodes}
+        elif len(nodes) <= SPRING_LAYOUT_MAX_NODES:
+            local = nx.spring_layout(subgraph, weight="weight", seed=seed)
+        else:
+            local = nx.spectral_layout(subgraph, weight="weight")
+
+        if x > 0 and x + 2 * radius > row_width:
+            x, y, row_height = 0.0, y - row_height, 0.0
+        center = np.array([x + radius, y - radius])
+        for node, position in local.items():
+            positions[node] = center + np.asarray(position) * radius * 0.9
+        x += 2 * radius
+        row_height = max(row_height, 2 * radius)
+    return positions
+
+def get_relationship_graph(relationships, key):
+    """Return the weighted graph for a dataset's relationships, building it once per key."""
+    G = _graph_cache.get(key)
+    if G is None:
+        G = build_relationship_graph(relationships)
+        _graph_cache.put(key, G)
+    return G
+
+def relationship_network(relationships, key, min_weight=1, min_degree=1, max_edges=DEFAULT_MAX_EDGES,
+                         collapse=False):
+    """
+    Prune (and optionally collapse) a dataset's relationship graph and lay it out.
+
+    Parameters:
+    - relationships (iterable of (subject, verb, object)): The extracted relationships.
+    - key (str): Identifies the dataset, e.g. its dataset_hash; results are cached under it.
+    - min_weight, min_degree, max_edges: See prune_graph.
+    - collapse (bool): Show Louvain communities instead of individual entities.
+
+    Returns:
+    - G (nx.Graph): The graph to draw.
+    - positions (dict): Node -> (x, y).
+    """
+    layout_key = (key, min_weight, min_degree, max_edges, collapse)
+    cached = _layout_cache.get(layout_key)
+    if cached is not None:
+        return cached
+
+    G = prune_graph(get_relationship_graph(relationships, key), min_weight, min_degree, max_edges)
+    if collapse and len(G):
+        G = collapse_communities(G)
+    result = (G, compute_layout(G))
+    _layout_cache.put(layout_key, result)
+    return result
+
+def plot_network(G, positions, title="Relationship Network", labelled_nodes=DEFAULT_LABELLED_NODES):
+    """
+    Draw a laid-out graph with WebGL traces.
+
+    All edges go into a single trace. Node size follows weighted degree (member count
+    for collapsed communities), and only the labelled_nodes largest nodes get a text
+    label (the rest show on hover).
+    """
+    edge_x, edge_y = [], []
+    for u, v in G.edges():
+        x0, y0 = positions[u]
+        x1, y1 = positions[v]
+        edge_x.extend([x0, x1, None])
+        edge_y.extend([y0, y1, None])
+
+    nodes = list(G.nodes())
+    strength = dict(G.degree(weight="weight"))
+    # Collapsed communities are sized by their number of members, entities by weighted degree
+    weight = {node: data.get("size", strength[node]) for node, data in G.nodes(data=True)}
+    node_weight = np.array([weight[node] for node in nodes], dtype=float)
+    labelled = set(heapq.nlargest(labelled_nodes, nodes, key=weight.get))
+    sizes = 8 + 22 * np.sqrt(node_weight / max(node_weight.max(), 1)) if len(nodes) else []
+
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(
+        x=edge_x, y=edge_y,
+        line=dict(width=0.5, color='#004080'),
+        hoverinfo='none',
+        mode='lines'
+    ))
+    fig.add_trace(go.Scattergl(
+        x=[positions[node][0] for node in nodes],
+        y=[positions[node][1] for node in nodes],
+        mode='markers+text',
+        text=[node if node in labelled else "" for node in nodes],
+        hovertext=[f"{node} ({int(strength[node])})" for node in nodes],
+        textposition="top center",
+        textfont=dict(color='black'),
+        marker=dict(size=sizes, color='lightblue', line=dict(width=1, color='darkblue')),
+        hoverinfo='text'
+    ))
+    fig.update_layout(
+        title=title,
+        showlegend=False,
+        hovermode='closest',
+        margin=dict(b=20, l=5, r=5, t=40),
+        xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+        yaxis=dict(showgrid=False, zeroline=False, showticklabels=False, scaleanchor="x"),
+        height=500
+    )
+    return fig
@@ -0,0 +1,84 @@
+# nlp_models.py
+
+import gc
+import os
+import threading
+import time
+
+import spacy
+
+from instrumentation import current_rss_bytes
+
+DEFAULT_MODEL = "en_core_web_sm"
+
+# Components each kind of output depends on
+ENTITY_COMPONENTS = ("ner",)
+RELATIONSHIP_COMPONENTS = ("tok2vec", "tagger", "attribute_ruler", "parser")
+
+# Loaded pipelines keyed by (model name, loaded components)
+_pipelines = {}
+_load_metrics = []
+_lock = threading.Lock()
+
+def _model_components(name):
+    """Return every component a model package ships with, without loading its weights."""
+    try:
+        return tuple(spacy.util.load_meta(spacy.util.get_package_path(name) / "meta.json")["pipeline"])
+    except Exception:
+        return None
+
+def get_nlp(name=DEFAULT_MODEL, components=None):
+    """
+    Return a shared spaCy pipeline, loading it on first use.
+
+    Parameters:
+    - name (str): The model package to load.
+    - components (iterable of str, optional): The components the caller needs. Others are
+      excluded when the model is loaded. An already-loaded pipeline that has all of them is
+      reused instead of loading another copy. Leave as None to load every component.
+
+    Callers that get back a larger pipeline than they asked for should pass
+    disabled_components(nlp, components) when parsing.
+    """
+    wanted = None if components is None else frozenset(components)
+    with _lock:
+        for (loaded_name, loaded_components), nlp in _pipelines.items():
+            if loaded_name == name and (loaded_components is None or (wanted is not None and wanted <= loaded_components)):
+                return nlp
+
+        all_components = _model_components(name)
+        exclude = [] if wanted is None or all_components is None else [c for c in all_components if c not in wanted]
+
+        rss_before = current_rss_bytes()
+        start = time.perf_counter()
+        nlp = spacy.load(name, exclude=exclude)
+        _load_metrics.append({
+            "model": name,
+            "components": list(nlp.pipe_names),
+            "load_seconds": time.perf_counter() - start,
+            "rss_delta_bytes": current_rss_bytes() - rss_before,
+            "pid": os.getpid(),
+        })
+        _pipelines[(name, wanted if exclude else None)] = nlp
+        return nlp
+
+def disabled_components(nlp, components):
+    """Return the components of nlp that are not in components, for nlp(..., disable=...)."""
+    return [name for name in nlp.pipe_names if name not in components]
+
+def preload(name=DEFAULT_MODEL, components=None):
+    """
+    Load a pipeline up front and freeze the garbage collector's view of it.
+
+    Call this in a parent process before forking workers (gunicorn --preload,
+    ProcessPoolExecutor with the fork start method) so children share the model's
+    memory pages copy-on-write instead of each loading their own copy.
+    """
+    nlp = get_nlp(name, components)
+    gc.collect()
+    gc.freeze()  # Keep gc from touching (and so copying) the preloaded objects in forked children
+    return nlp
+
+def load_metrics():
+    """Return one record per pipeline loaded in this process (time taken and RSS growth)."""
+    return list(_load_metrics)
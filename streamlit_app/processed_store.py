@@ -0,0 +1,59 @@
+# processed_store.py
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ENTITY_FIELDS = ("text", "label")
+RELATIONSHIP_FIELDS = ("subject", "verb", "object")
+
+PROCESSED_SCHEMA = pa.schema([
+    ("Text", pa.string()),
+    ("entities", pa.list_(pa.struct([(field, pa.string()) for field in ENTITY_FIELDS]))),
+    ("relationships", pa.list_(pa.struct([(field, pa.string()) for field in RELATIONSHIP_FIELDS]))),
+])
+
+def _to_struct_lists(rows, fields):
+    return [[dict(zip(fields, item)) for item in row] for row in rows]
+
+def to_table(dataframe):
+    """Convert a processed dataframe (lists of tuples per row) to a typed Arrow table."""
+    return pa.table({
+        "Text": dataframe["Text"].tolist(),
+        "entities": _to_struct_lists(dataframe["entities"], ENTITY_FIELDS),
+        "relationships": _to_struct_lists(dataframe["relationships"], RELATIONSHIP_FIELDS),
+    }, schema=PROCESSED_SCHEMA)
+
+def write_processed(dataframe, path):
+    """Write a processed dataframe to Parquet with list<struct> entity and relationship columns."""
+    pq.write_table(to_table(dataframe), path)
+
+def open_processed_writer(path):
+    """Open a Parquet writer so processed batches can be appended as row groups."""
+    return pq.ParquetWriter(path, PROCESSED_SCHEMA)
+
+def _list_column_to_tuples(column, fields):
+    """Rebuild per-row lists of tuples from a list<struct> column without per-cell parsing."""
+    array = column.combine_chunks()
+    offsets = array.offsets.to_numpy()
+    offsets = offsets - offsets[0]
+    values = array.flatten()
+    items = list(zip(*(values.field(field).to_pylist() for field in fields)))
+    return [items[offsets[k]:offsets[k + 1]] for k in range(len(array))]
+
+def load_processed(path):
+    """
+    Load a processed Parquet file through a memory map.
+
+    Returns:
+    - A dataframe with 'Text', 'entities' (lists of (text, label) tuples) and
+      'relationships' (lists of (subject, verb, object) tuples) columns.
+    """
+    table = pq.read_table(path, memory_map=True)
+    dataframe = table.select(["Text"]).to_pandas()
+    dataframe["entities"] = _list_column_to_tuples(table.column("entities"), ENTITY_FIELDS)
+    dataframe["relationships"] = _list_column_to_tuples(table.column("relationships"), RELATIONSHIP_FIELDS)
+    return dataframe
+
+def load_texts(path):
+    """Load only the 'Text' column of a processed Parquet file, e.g. for topic modeling."""
+    return pq.read_table(path, columns=["Text"], memory_map=True).to_pandas()
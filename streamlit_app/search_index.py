@@ -0,0 +1,239 @@
+# search_index.py
+
+import pickle
+import re
+from array import array
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# A query is made of "quoted phrases", OR, NOT/-term and bare terms
+QUERY_PATTERN = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+EMPTY = np.zeros(0, dtype=np.int32)
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+def _contains(sorted_values, values):
+    """Mask of values found in the sorted array sorted_values (a binary search each, no sorting)."""
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=bool)
+    found = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[found] == values
+
+def _intersect(a, b):
+    """Intersection of two sorted arrays of distinct values."""
+    if len(a) > len(b):
+        a, b = b, a
+    return a[_contains(b, a)]
+
+class InvertedIndex:
+    """
+    Positional inverted index over a collection of documents with BM25 ranking.
+
+    Queries support bare terms (all must match), "quoted phrases", OR between groups of
+    terms, and NOT term / -term exclusions, e.g. 'vendor "tender procedures" -airport'.
+
+    Postings are flat NumPy arrays sorted by (term, document, position): each term owns
+    a slice of (document, frequency) pairs, and each pair a slice of positions. Term
+    IDFs and per-document length norms are computed once when the index is frozen, so
+    a query intersects sorted arrays, scores the matches in bulk and only orders the
+    top of the ranking.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.terms = {}     # token -> term code
+        self.doc_ids = []   # document index -> doc_id
+        self.doc_lengths = np.zeros(0, dtype=np.int32)
+        self.term_pairs = np.zeros(1, dtype=np.int64)  # term code -> its slice of the pairs
+        self.pair_docs = EMPTY                         # pair -> document index
+        self.pair_frequencies = EMPTY                  # pair -> occurrences of the term in the document
+        self.pair_positions = np.zeros(1, dtype=np.int64)  # pair -> its slice of positions
+        self.positions = EMPTY
+        self.idf = np.zeros(0)
+        self.length_norms = np.zeros(0)
+        # Documents added since the index was last frozen: the term code of each token, and their lengths
+        self._pending_terms = array("i")
+        self._pending_lengths = array("i")
+
+    @classmethod
+    def from_texts(cls, texts, doc_ids=None):
+        index = cls()
+        for doc_id, text in zip(doc_ids if doc_ids is not None else range(len(texts)), texts):
+            index.add(doc_id, text)
+        index._freeze()
+        return index
+
+    def add(self, doc_id, text):
+        """Index one document; doc_id must not have been added before."""
+        tokens = tokenize(text)
+        terms = self.terms
+        codes = list(map(terms.get, tokens))
+        if None in codes:  # New tokens; once the vocabulary has filled up this is rare
+            codes = [terms.setdefault(token, len(terms)) for token in tokens]
+        self._pending_terms.extend(codes)
+        self._pending_lengths.append(len(tokens))
+        self.doc_ids.append(doc_id)
+
+    def _freeze(self):
+        """Merge the pending documents into the sorted postings and recompute the BM25 statistics."""
+        if not self._pending_lengths:
+            return
+        lengths = np.asarray(self._pending_lengths, dtype=np.int32)
+        first_doc = len(self.doc_lengths)
+        token_starts = np.cumsum(lengths) - lengths
+
+        # Expand the frozen postings back to one entry per token and append the pending ones
+        pair_terms = np.repeat(np.arange(len(self.term_pairs) - 1, dtype=np.int32), np.diff(self.term_pairs))
+        term_codes = np.concatenate([np.repeat(pair_terms, self.pair_frequencies),
+                                     np.asarray(self._pending_terms, dtype=np.int32)])
+        docs = np.concatenate([np.repeat(self.pair_docs, self.pair_frequencies),
+                               np.repeat(np.arange(first_doc, first_doc + len(lengths), dtype=np.int32), lengths)])
+        positions = np.concatenate([self.positions, np.arange(lengths.sum()) - np.repeat(token_starts, lengths)])
+
+        # Tokens of each term are in (document, position) order already, so a stable sort by term suffices
+        order = np.argsort(term_codes, kind="stable")
+        term_codes, docs, self.positions = term_codes[order], docs[order], positions[order].astype(np.int32)
+
+        new_pair = np.ones(len(docs), dtype=bool)
+        new_pair[1:] = (term_codes[1:] != term_codes[:-1]) | (docs[1:] != docs[:-1])
+        pair_starts = np.flatnonzero(new_pair)
+        self.pair_positions = np.append(pair_starts, len(docs)).astype(np.int64)
+        self.pair_docs = docs[pair_starts].astype(np.int32)
+        self.pair_frequencies = np.diff(self.pair_positions).astype(np.int32)
+        pairs_per_term = np.bincount(term_codes[pair_starts], minlength=len(self.terms))
+        self.term_pairs = np.concatenate([[0], np.cumsum(pairs_per_term)]).astype(np.int64)
+
+        self.doc_lengths = np.concatenate([self.doc_lengths, lengths])
+        self._pending_terms, self._pending_lengths = array("i"), array("i")
+
+        num_docs = len(self.doc_lengths)
+        self.idf = np.log(1 + (num_docs - pairs_per_term + 0.5) / (pairs_per_term + 0.5))
+        average_length = max(self.doc_lengths.mean(), 1e-9)
+        self.length_norms = self.k1 * (1 - self.b + self.b * self.doc_lengths / average_length)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def save(self, path):
+        self._freeze()
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def _pairs(self, term):
+        """The slice of pairs (document, frequency) for a token, empty when it was never seen."""
+        code = self.terms.get(term)
+        if code is None or code >= len(self.term_pairs) - 1:
+            return slice(0, 0)
+        return slice(self.term_pairs[code], self.term_pairs[code + 1])
+
+    def _term_docs(self, term):
+        """Sorted document indexes containing term."""
+        return self.pair_docs[self._pairs(term)]
+
+    def _phrase_docs(self, terms):
+        """Documents where terms occur consecutively, checked against the positional postings."""
+        candidates = self._term_docs(terms[0])
+        for term in terms[1:]:
+            candidates = _intersect(candidates, self._term_docs(term))
+        if not len(candidates):
+            return EMPTY
+
+        # Key each occurrence by (document, position the phrase would start at); a phrase
+        # match is a key every term shares
+        starts = None
+        for offset, term in enumerate(terms):
+            pairs = self._pairs(term)
+            # Every candidate contains the term, so its pair is found by binary search
+            kept = pairs.start + np.searchsorted(self.pair_docs[pairs], candidates)
+            frequencies = self.pair_frequencies[kept]
+            # Gather the positions slices of the kept pairs in one indexing operation
+            gathered = np.cumsum(frequencies) - frequencies
+            token_positions = self.positions[np.repeat(self.pair_positions[kept] - gathered, frequencies)
+                                             + np.arange(frequencies.sum())]
+            keys = (np.repeat(candidates, frequencies).astype(np.int64) << 32) + token_positions - offset
+            starts = keys if starts is None else _intersect(starts, keys)
+            if not len(starts):
+                return EMPTY
+        return np.unique(starts >> 32).astype(np.int32)
+
+    def _parse(self, query):
+        """Split a query into OR-separated clauses of (required, excluded) lists of token tuples."""
+        clauses = [([], [])]
+        negate_next = False
+        for match in QUERY_PATTERN.finditer(query):
+            minus, phrase, word = match.groups()
+            if word == "OR":
+                clauses.append(([], []))
+                continue
+            if word == "NOT":
+                negate_next = True
+                continue
+            if word is not None and word.startswith("-") and len(word) > 1:
+                minus, word = "-", word[1:]
+            terms = tuple(tokenize(phrase if phrase is not None else word))
+            if terms:
+                required, excluded = clauses[-1]
+                (excluded if minus or negate_next else required).append(terms)
+            negate_next = False
+        return [clause for clause in clauses if clause[0]]
+
+    def _matching_docs(self, terms):
+        return self._term_docs(terms[0]) if len(terms) == 1 else self._phrase_docs(list(terms))
+
+    def _bm25(self, docs, terms):
+        """BM25 scores of the sorted document indexes docs for the query terms."""
+        scores = np.zeros(len(docs))
+        norms = self.length_norms[docs]
+        for term in terms:
+            pairs = self._pairs(term)
+            term_docs = self.pair_docs[pairs]
+            if not len(term_docs):
+                continue
+            found = np.minimum(np.searchsorted(term_docs, docs), len(term_docs) - 1)
+            frequencies = np.where(term_docs[found] == docs, self.pair_frequencies[pairs][found], 0)
+            scores += self.idf[self.terms[term]] * frequencies * (self.k1 + 1) / (frequencies + norms)
+        return scores
+
+    def search(self, query, page=1, page_size=10):
+        """
+        Run a query and return one page of results ranked by BM25.
+
+        Returns:
+        - total (int): Number of matching documents.
+        - results (list of (doc_id, score)): The requested page, best match first.
+        """
+        self._freeze()
+        matched = np.zeros(len(self.doc_ids), dtype=bool)
+        scored_terms = set()
+        for required, excluded in self._parse(query):
+            clause_docs = None
+            for terms in sorted(required, key=lambda t: len(self._term_docs(t[0]))):
+                docs = self._matching_docs(terms)
+                clause_docs = docs if clause_docs is None else _intersect(clause_docs, docs)
+                if not len(clause_docs):
+                    break
+            for terms in excluded:
+                clause_docs = clause_docs[~_contains(self._matching_docs(terms), clause_docs)]
+            matched[clause_docs] = True
+            scored_terms.update(term for terms in required for term in terms)
+        matches = np.flatnonzero(matched)
+
+        # Only the pages up to the requested one need to be ranked; ties go to the earlier document
+        scores = self._bm25(matches, scored_terms)
+        top = page * page_size
+        candidates = np.arange(len(matches))
+        if top < len(matches):
+            threshold = np.partition(scores, len(scores) - top)[len(scores) - top]
+            above = np.flatnonzero(scores > threshold)
+            candidates = np.concatenate([above, np.flatnonzero(scores == threshold)[:top - len(above)]])
+        ranked = candidates[np.lexsort((candidates, -scores[candidates]))][(page - 1) * page_size:top]
+        return len(matches), [(self.doc_ids[matches[i]], float(scores[i])) for i in ranked]
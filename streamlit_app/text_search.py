@@ -1,27 +1,62 @@
-import spacy
-import re
-import streamlit as st
+import html
+from lru import LRUCache
+from nlp_models import get_nlp, disabled_components, ENTITY_COMPONENTS
 
-# Load the SpaCy NLP model (load once globally)
-nlp = spacy.load("en_core_web_sm")
+# Parsed Docs of recently highlighted texts, so re-rendering search results does not re-parse them
+DOC_CACHE_SIZE = 1024
+_doc_cache = LRUCache(DOC_CACHE_SIZE)
 
-# Function to extract and highlight entities
-def highlight_entities(text):
+def _parse_all(texts, batch_size=64):
+    """Return a Doc per text, parsing only the texts missing from the cache in one nlp.pipe call."""
+    # The cache is shared by concurrent Streamlit sessions; it locks each lookup, not the parsing
+    docs = {}
+    for text in dict.fromkeys(texts):
+        doc = _doc_cache.get(text)
+        if doc is not None:
+            docs[text] = doc
+    missing = [text for text in dict.fromkeys(texts) if text not in docs]
+    if missing:
+        # Shared pipeline, loaded on first use; only the NER component is needed here
+        nlp = get_nlp(components=ENTITY_COMPONENTS)
+        disable = disabled_components(nlp, ENTITY_COMPONENTS)
+        docs.update(zip(missing, nlp.pipe(missing, batch_size=batch_size, disable=disable)))
+
+    for text, doc in docs.items():
+        _doc_cache.put(text, doc)
+    return [docs[text] for text in texts]
+
+def highlight_doc(doc):
     """
-    Extracts entities from text and highlights them using HTML span tags.
+    Wrap each entity of a parsed Doc in a highlight span in a single pass over the text.
+
+    Uses the entities' own character offsets, which SpaCy keeps sorted and
+    non-overlapping, so no span can be wrapped twice. Text is HTML-escaped.
     """
-    doc = nlp(text)
-    entities = [(ent.text, ent.label_) for ent in doc.ents]
+    text = doc.text
+    parts = []
+    last_end = 0
+    for ent in doc.ents:
+        parts.append(html.escape(text[last_end:ent.start_char]))
+        parts.append(f"<span class='highlight {ent.label_.lower()}'>{html.escape(ent.text)}</span>")
+        last_end = ent.end_char
+    parts.append(html.escape(text[last_end:]))
+    return "".join(parts)
 
-    # Sort entities by length (longer first) to avoid nested replacements
-    highlighted_text = text
-    for entity, label in sorted(entities, key=lambda x: len(x[0]), reverse=True):
-        highlighted_text = re.sub(
-            rf"\b{re.escape(entity)}\b",
-            f"<span class='highlight {label.lower()}'>{entity}</span>",
-            highlighted_text,
-            flags=re.IGNORECASE
-        )
+def highlight_texts(texts, batch_size=64):
+    """
+    Highlight the entities of many texts, e.g. a page of search results.
 
-    return highlighted_text, entities
+    Returns:
+    - A list of (highlighted_html, entities) tuples, one per text.
+    """
+    return [
+        (highlight_doc(doc), [(ent.text, ent.label_) for ent in doc.ents])
+        for doc in _parse_all(list(texts), batch_size)
+    ]
 
+# Function to extract and highlight entities
+def highlight_entities(text):
+    """
+    Extracts entities from text and highlights them using HTML span tags.
+    """
+    return highlight_texts([text])[0]
@@ -1,40 +1,208 @@
 # topic_modeling.py
 
+import copy
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.decomposition import LatentDirichletAllocation
 import plotly.express as px
 
-def perform_lda_topic_modeling(df, num_topics=5):
+from lru import LRUCache
+
+# Cached document-term matrices and fitted models, so slider changes do not refit from scratch
+MAX_CACHED_DATASETS = 4
+_dtm_cache = LRUCache(MAX_CACHED_DATASETS)        # dataset hash -> (vectorizer, document-term matrix)
+_model_cache = LRUCache(MAX_CACHED_DATASETS * 9)  # (dataset hash, num_topics) -> fitted LDA model
+
+DEFAULT_LDA_BATCH_SIZE = 512
+
+def dataset_hash(texts):
+    """Hash a sequence of texts, used as the cache key for a dataset."""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(str(text).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def get_document_term_matrix(texts, key=None):
+    """
+    Return the (vectorizer, document-term matrix) for texts, building it only once per dataset.
+    """
+    key = key or dataset_hash(texts)
+    cached = _dtm_cache.get(key)
+    if cached is not None:
+        return cached
+    vectorizer = CountVectorizer(stop_words='english')
+    X = vectorizer.fit_transform(texts)
+    _dtm_cache.put(key, (vectorizer, X))
+    return vectorizer, X
+
+def new_lda_model(num_topics, n_jobs=-1, batch_size=DEFAULT_LDA_BATCH_SIZE):
+    """An LDA model configured for online (minibatch) learning, so it can be updated with partial_fit."""
+    return LatentDirichletAllocation(
+        n_components=num_topics,
+        learning_method='online',
+        batch_size=batch_size,
+        n_jobs=n_jobs,
+        random_state=42,
+    )
+
+def top_words_per_topic(lda_model, vectorizer, num_words=10):
+    feature_names = vectorizer.get_feature_names_out()
+    topics = []
+    for topic_idx, topic in enumerate(lda_model.components_):
+        top_words_idx = topic.argsort()[:-num_words - 1:-1]
+        top_words = [feature_names[i] for i in top_words_idx]
+        topics.append((f"Topic {topic_idx+1}", top_words))
+    return topics
+
+def _texts(df):
+    return df['Text'].fillna('').astype(str)
+
+def perform_lda_topic_modeling(df, num_topics=5, n_jobs=-1):
     """
     Perform Latent Dirichlet Allocation (LDA) topic modeling on the text data.
 
+    The document-term matrix is cached per dataset and fitted models per
+    (dataset, num_topics), so repeated calls with the same data return immediately.
+
     Parameters:
     - df (pd.DataFrame): The dataframe with a 'Text' column.
     - num_topics (int): Number of topics to extract.
+    - n_jobs (int): Number of cores used while fitting (-1 uses all of them).
 
     Returns:
     - topics: The topics extracted by LDA.
     - lda_model: The fitted LDA model.
     - vectorizer: The CountVectorizer used to convert the text into vectors.
     """
+    texts = _texts(df)
+    key = dataset_hash(texts)
+
     # Convert the text data into a format suitable for LDA (e.g., Bag of Words)
-    vectorizer = CountVectorizer(stop_words='english')
-    X = vectorizer.fit_transform(df['Text'])
+    vectorizer, X = get_document_term_matrix(texts, key)
+
+    # Perform LDA, reusing a model already fitted on this dataset
+    lda_model = _model_cache.get((key, num_topics))
+    if lda_model is None:
+        lda_model = new_lda_model(num_topics, n_jobs)
+        lda_model.fit(X)
+    _model_cache.put((key, num_topics), lda_model)
+
+    return top_words_per_topic(lda_model, vectorizer), lda_model, vectorizer
+
+def update_lda_topic_modeling(df, new_rows, num_topics=5, n_jobs=-1):
+    """
+    Fold new rows into the model fitted on df with partial_fit instead of refitting.
+
+    The vocabulary stays fixed to the one learned from df, so words seen only in
+    new_rows are ignored. The updated model is cached under the combined dataset.
+
+    Returns:
+    - The same (topics, lda_model, vectorizer) as perform_lda_topic_modeling for the
+      combined rows.
+    """
+    _, lda_model, vectorizer = perform_lda_topic_modeling(df, num_topics, n_jobs)
+    _, X = get_document_term_matrix(_texts(df))
+    X_new = vectorizer.transform(_texts(new_rows))
 
-    # Perform LDA
-    lda_model = LatentDirichletAllocation(n_components=num_topics, random_state=42)
+    # Copy so the cached model for df alone is left untouched
+    updated_model = copy.deepcopy(lda_model)
+    updated_model.partial_fit(X_new)
+
+    combined_key = dataset_hash(pd.concat([_texts(df), _texts(new_rows)]))
+    _dtm_cache.put(combined_key, (vectorizer, sparse.vstack([X, X_new]).tocsr()))
+    _model_cache.put((combined_key, num_topics), updated_model)
+
+    return top_words_per_topic(updated_model, vectorizer), updated_model, vectorizer
+
+# Candidate topic counts offered by the dashboard slider
+DEFAULT_TOPIC_COUNTS = range(2, 11)
+
+_sweep_matrix = None  # Document-term matrix handed to each sweep worker once, at start-up
+_sweep_executor = ThreadPoolExecutor(max_workers=1)  # Runs sweeps off the Streamlit script thread
+_sweeps = LRUCache(MAX_CACHED_DATASETS)  # dataset key -> Future of the sweep result
+
+def umass_coherence(lda_model, X, num_words=10):
+    """
+    Average UMass coherence of the topics' top words, from document co-occurrence counts in X.
+
+    Scores are negative; values closer to zero mean the top words co-occur more often.
+    """
+    binary = (X > 0).astype(np.int32).tocsc()
+    scores = []
+    for topic in lda_model.components_:
+        top_words_idx = topic.argsort()[:-num_words - 1:-1]
+        columns = binary[:, top_words_idx]
+        co_documents = (columns.T @ columns).toarray()  # Documents containing both words
+        later, earlier = np.tril_indices(len(top_words_idx), k=-1)
+        scores.append(np.log((co_documents[later, earlier] + 1) / co_documents[earlier, earlier]).sum())
+    return float(np.mean(scores))
+
+def _init_sweep_worker(X):
+    global _sweep_matrix
+    _sweep_matrix = X
+
+def _fit_topic_count(num_topics):
+    X = _sweep_matrix
+    lda_model = new_lda_model(num_topics, n_jobs=1)
     lda_model.fit(X)
+    return num_topics, lda_model, lda_model.perplexity(X), umass_coherence(lda_model, X)
 
-    # Extract topics and their top words
-    topics = []
-    feature_names = vectorizer.get_feature_names_out()
-    for topic_idx, topic in enumerate(lda_model.components_):
-        top_words_idx = topic.argsort()[:-11:-1]
-        top_words = [feature_names[i] for i in top_words_idx]
-        topics.append((f"Topic {topic_idx+1}", top_words))
+def sweep_topic_counts(df, topic_counts=DEFAULT_TOPIC_COUNTS, max_workers=None):
+    """
+    Fit one LDA model per candidate topic count in parallel and score each of them.
+
+    Each worker receives the cached document-term matrix once, at start-up, and the
+    fitted models are added to the model cache so perform_lda_topic_modeling returns
+    them immediately. Workers are spawned rather than forked: sweeps run on a
+    background thread of the (multithreaded) Streamlit server, and forking it could
+    copy locks held by other threads into the children.
+
+    Returns:
+    - scores (pd.DataFrame): 'Topics', 'Perplexity' and 'Coherence' per candidate.
+    - recommended (int): The topic count with the highest coherence.
+    """
+    texts = _texts(df)
+    key = dataset_hash(texts)
+    _, X = get_document_term_matrix(texts, key)
 
-    return topics, lda_model, vectorizer
+    context = multiprocessing.get_context('spawn')
+    workers = min(max_workers or os.cpu_count(), len(topic_counts))
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_sweep_worker, initargs=(X,)) as executor:
+        for num_topics, lda_model, perplexity, coherence in executor.map(_fit_topic_count, topic_counts):
+            _model_cache.put((key, num_topics), lda_model)
+            rows.append({'Topics': num_topics, 'Perplexity': perplexity, 'Coherence': coherence})
+
+    scores = pd.DataFrame(rows)
+    # Ties go to the smaller topic count, which is listed first
+    recommended = int(scores.loc[scores['Coherence'].idxmax(), 'Topics'])
+    return scores, recommended
+
+def start_topic_sweep(df, topic_counts=DEFAULT_TOPIC_COUNTS, key=None):
+    """
+    Start sweep_topic_counts in the background, once per dataset.
+
+    A sweep that failed is started again on the next call. Pass key (any string that
+    identifies the dataset) to avoid hashing every text on each call.
+
+    Returns:
+    - A concurrent.futures.Future resolving to sweep_topic_counts' result.
+    """
+    key = key or dataset_hash(_texts(df))
+    sweep = _sweeps.get(key)
+    if sweep is None or (sweep.done() and sweep.exception() is not None):
+        sweep = _sweep_executor.submit(sweep_topic_counts, df, topic_counts)
+    _sweeps.put(key, sweep)
+    return sweep
 
 def plot_lda_topics(lda_model, vectorizer, num_topics=5):
     """
@@ -1,5 +1,8 @@
+import numpy as np
 import pandas as pd
 import string
+from dataclasses import dataclass
+from duplicate_detection import find_subset_pairs, find_near_duplicate_pairs
 
 # Function to clean and preprocess text
 def clean_text(text):
@@ -9,50 +12,141 @@ def clean_text(text):
     text = ' '.join(text.split())  # Remove extra spaces
     return text
 
-# Function to validate the data
-def validate_data(df):
-    # Initialize the validation log with the appropriate columns
-    validation_log = []
+# Punctuation removal table shared by clean_text and clean_texts
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+# Function to clean a whole column at once
+def clean_texts(texts):
+    """Vectorized clean_text over a Series; missing values become empty strings."""
+    return (
+        texts.fillna('').astype(str)
+        .str.lower()
+        .str.translate(PUNCTUATION_TABLE)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
+
+@dataclass
+class ValidationReport:
+    """Row masks and error log computed once per sheet, reusable by resolve_errors."""
+    missing: np.ndarray     # Rows with no 'Text'
+    duplicated: np.ndarray  # Rows whose 'Text' occurs more than once
+    redundant: np.ndarray   # Duplicated rows after their first occurrence
+    log: pd.DataFrame
+
+def _pair_log(error_type, i, j, descriptions):
+    return pd.DataFrame({
+        'Error Type': error_type,
+        'Description': descriptions,
+        'Row Number': (i + 2).astype(str) + ', ' + (j + 2).astype(str)  # Add 2 to row number (Excel row 1 is header)
+    })
+
+# Function to build the validation report
+def build_validation_report(df, check_subsets=True, near_duplicate_threshold=None):
+    """
+    Compute every validation mask once and build the error log from index arrays.
+
+    Parameters:
+    - df (pd.DataFrame): The dataframe with a 'Text' column.
+    - check_subsets (bool): Whether to look for texts contained in other texts.
+    - near_duplicate_threshold (float, optional): When set, also report pairs of rows whose
+      word-shingle similarity is at least this value (between 0 and 1).
+
+    Returns:
+    - ValidationReport
+    """
+    texts = df['Text']
+    row_numbers = df.index.to_numpy() + 2  # Add 2 to row number (Excel row 1 is header)
+
+    missing = texts.isna().to_numpy()
+    redundant = df.duplicated(subset=['Text'], keep='first').to_numpy()
+    duplicated = redundant | df.duplicated(subset=['Text'], keep='last').to_numpy()
+
+    logs = []
 
     # 1. Validate for missing values in 'Text' column
-    missing_values = df[df['Text'].isna()]
-    if not missing_values.empty:
-        missing_value_errors = missing_values.apply(lambda row: {
+    if missing.any():
+        logs.append(pd.DataFrame({
             'Error Type': 'Missing Value',
-            'Description': f"Missing value found in 'Text' column",
-            'Row Number': row.name + 2  # Add 2 to row number (Excel row 1 is header)
-        }, axis=1)
-        validation_log.extend(missing_value_errors)
+            'Description': "Missing value found in 'Text' column",
+            'Row Number': row_numbers[missing]
+        }))
 
     # 2. Validate for duplicates (exact duplicates in 'Text' column)
-    duplicates = df[df.duplicated(subset=['Text'], keep=False)]
-    if not duplicates.empty:
-        duplicate_errors = duplicates.apply(lambda row: {
+    if duplicated.any():
+        logs.append(pd.DataFrame({
             'Error Type': 'Duplicate Entry',
-            'Description': f"Duplicate entry found in 'Text' column: {row['Text']}",
-            'Row Number': row.name + 2  # Add 2 to row number (Excel row 1 is header)
-        }, axis=1)
-        validation_log.extend(duplicate_errors)
+            'Description': "Duplicate entry found in 'Text' column: " + texts[duplicated].map(str).to_numpy(),
+            'Row Number': row_numbers[duplicated]
+        }))
 
     # 3. Validate for subset duplicates (i.e., one text is a subset of another)
-    cleaned_texts = df['Text'].apply(clean_text).values
-
-    for i in range(len(cleaned_texts)):
-        for j in range(i + 1, len(cleaned_texts)):
-            text_i = cleaned_texts[i]
-            text_j = cleaned_texts[j]
-            
-            # Check if one text is a subset of another
-            if text_i in text_j or text_j in text_i:
-                validation_log.append({
-                    'Error Type': 'Subset Duplicate',
-                    'Description': f"Text in row {i+2} is a subset of text in row {j+2}" if text_i in text_j else f"Text in row {j+2} is a subset of text in row {i+2}",
-                    'Row Number': f"{i+2}, {j+2}"  # Add 2 to row number (Excel row 1 is header)
-                })
-
-    # Convert the list of validation errors to a DataFrame
-    validation_log_df = pd.DataFrame(validation_log, columns=["Error Type", "Description", "Row Number"])
-    return validation_log_df
+    # Missing texts are already reported above, so they are left out of the comparison
+    if check_subsets or near_duplicate_threshold is not None:
+        cleaned_texts = clean_texts(texts).tolist()
+
+    if check_subsets:
+        pairs = np.array(find_subset_pairs(cleaned_texts), dtype=np.int64).reshape(-1, 4)
+        if len(pairs):
+            i, j, subset_rows, superset_rows = pairs.T
+            descriptions = (
+                "Text in row " + pd.Series(subset_rows + 2).astype(str)
+                + " is a subset of text in row " + pd.Series(superset_rows + 2).astype(str)
+            )
+            logs.append(_pair_log('Subset Duplicate', pd.Series(i), pd.Series(j), descriptions))
+
+    # 4. Optionally validate for near duplicates (texts that differ only slightly)
+    if near_duplicate_threshold is not None:
+        near_pairs = find_near_duplicate_pairs(cleaned_texts, near_duplicate_threshold)
+        if near_pairs:
+            i, j, similarity = (pd.Series(column) for column in zip(*near_pairs))
+            descriptions = (
+                "Text in row " + (i + 2).astype(str)
+                + " is a near duplicate of text in row " + (j + 2).astype(str)
+                + " (similarity " + similarity.map('{:.2f}'.format) + ")"
+            )
+            logs.append(_pair_log('Near Duplicate', i, j, descriptions))
+
+    columns = ["Error Type", "Description", "Row Number"]
+    log = pd.concat(logs, ignore_index=True)[columns] if logs else pd.DataFrame(columns=columns)
+    return ValidationReport(missing=missing, duplicated=duplicated, redundant=redundant, log=log)
+
+# Function to validate the data
+def validate_data(df, near_duplicate_threshold=None):
+    """
+    Validate the 'Text' column and return a log of the errors found.
+
+    Parameters:
+    - df (pd.DataFrame): The dataframe with a 'Text' column.
+    - near_duplicate_threshold (float, optional): When set, also report pairs of rows whose
+      word-shingle similarity is at least this value (between 0 and 1).
+    """
+    return build_validation_report(df, near_duplicate_threshold=near_duplicate_threshold).log
+
+# Function to resolve errors and clean the dataset
+# Reuses the masks from a ValidationReport instead of recomputing them
+def resolve_errors(df, report=None):
+    if report is None:
+        report = build_validation_report(df, check_subsets=False)
+
+    resolved_messages = []
+    keep = ~report.redundant
+    df = df[keep]
+    duplicate_count = int(report.duplicated.sum())
+    if duplicate_count:
+        resolved_messages.append(f"✅ Removed {duplicate_count} duplicate entries.")
+
+    missing = report.missing[keep]
+    missing_count = int(missing.sum())
+    if missing_count:
+        df = df[~missing]
+        resolved_messages.append(f"✅ Removed {missing_count} rows with missing text values.")
+
+    first_column_name = df.columns[0]
+    df_combined = df.groupby(first_column_name)['Text'].apply(lambda x: ' '.join(x)).reset_index()
+    resolved_messages.append(f"✅ Combined texts for rows with the same '{first_column_name}'.")
+
+    return df_combined, resolved_messages
 
 # Function to combine text based on the first column
 def combine_text_based_on_column1(df):
@@ -67,19 +161,19 @@ def combine_text_based_on_column1(df):
     return df_combined
 
 # Example usage
-data = {
-    'Column1': ['1.pdf', '1.pdf'],
-    'Text': [
-        "Pristina Airport – Possible administrative irregularity regarding tender procedures involving Vendor 1 and Vendor 2 Allegation",
-        "Investigative details In his/her interviews conducted on 31st August and 14th September 2004, Vendor 1 and Vendor 2 Representative admitted that the fact that both Vendor 1 and Vendor 2 took part together in three Airport tenders put other competitors at a disadvantage, but alleged both companies have never exchanged information with regard to the price offers."
-    ]
-}
-
-df = pd.DataFrame(data)
+if __name__ == "__main__":
+    data = {
+        'Column1': ['1.pdf', '1.pdf'],
+        'Text': [
+            "Pristina Airport – Possible administrative irregularity regarding tender procedures involving Vendor 1 and Vendor 2 Allegation",
+            "Investigative details In his/her interviews conducted on 31st August and 14th September 2004, Vendor 1 and Vendor 2 Representative admitted that the fact that both Vendor 1 and Vendor 2 took part together in three Airport tenders put other competitors at a disadvantage, but alleged both companies have never exchanged information with regard to the price offers."
+        ]
+    }
 
-# Call the function to combine text based on the first column
-df_combined = combine_text_based_on_column1(df)
+    df = pd.DataFrame(data)
 
-# Display the result
-print(df_combined)
+    # Call the function to combine text based on the first column
+    df_combined = combine_text_based_on_column1(df)
 
+    # Display the result
+    print(df_combined)
@@ -0,0 +1,23 @@
+# vocabulary.py
+
+import numpy as np
+
+class Vocabulary:
+    """Interns strings to consecutive integer codes, in first-seen order (None stays None)."""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        if value is None:
+            return None
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def codes_for(self, values):
+        """Codes of a sequence of strings, as an int32 array."""
+        return np.fromiter((self.code(value) for value in values), dtype=np.int32, count=len(values))
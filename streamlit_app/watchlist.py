@@ -0,0 +1,103 @@
+# watchlist.py
+
+import hashlib
+import pickle
+
+import spacy
+from spacy.matcher import PhraseMatcher
+from spacy.tokens import Span
+from spacy.util import filter_spans
+
+from ingest import read_table
+
+class Watchlist:
+    """
+    Finds known vendors, people and places by exact (case-insensitive) phrase matching.
+
+    Terms are tokenized once into pattern Docs and matched with a PhraseMatcher, so
+    looking them up needs only the tokenizer, never the tagger, parser or NER. A saved
+    watchlist stores the built matcher, so loading it skips tokenizing the terms.
+    """
+
+    def __init__(self, lang="en", matcher=None):
+        self.lang = lang
+        if matcher is None:
+            self.nlp = spacy.blank(lang)  # Tokenizer only
+            self.matcher = PhraseMatcher(self.nlp.vocab, attr="LOWER")
+        else:
+            self.nlp = spacy.blank(lang, vocab=matcher.vocab)
+            self.matcher = matcher
+        self.labels = {}              # match id -> label
+        self.patterns = []            # (term, label) in the order they were added
+        self._fingerprint = None
+
+    def add(self, terms, label):
+        """Add terms (strings) that should be tagged with label."""
+        terms = [term for term in (str(term).strip() for term in terms) if term]
+        self._add_patterns(terms, [label] * len(terms), list(self.nlp.tokenizer.pipe(terms)))
+
+    def _add_patterns(self, terms, labels, docs):
+        by_label = {}
+        for term, label, doc in zip(terms, labels, docs):
+            by_label.setdefault(label, []).append(doc)
+            self.patterns.append((term, label))
+        for label, label_docs in by_label.items():
+            self.labels[self.nlp.vocab.strings.add(label)] = label
+            self.matcher.add(label, label_docs)
+        self._fingerprint = None
+
+    @classmethod
+    def from_table(cls, source, term_column="term", label_column="label", lang="en"):
+        """Build a watchlist from an Excel, CSV or Parquet table with term and label columns."""
+        table = read_table(source).dropna(subset=[term_column, label_column])
+        watchlist = cls(lang)
+        for label, terms in table.groupby(label_column)[term_column]:
+            watchlist.add(terms, str(label))
+        return watchlist
+
+    def __len__(self):
+        return len(self.patterns)
+
+    @property
+    def fingerprint(self):
+        """Hash of the terms and labels, so cached results from another watchlist are not reused."""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for term, label in sorted(self.patterns):
+                digest.update(f"{term}\0{label}\0".encode("utf-8"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump({"lang": self.lang, "matcher": self.matcher, "labels": self.labels, "patterns": self.patterns},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+        watchlist = Watchlist(saved["lang"], saved["matcher"])
+        watchlist.labels = saved["labels"]
+        watchlist.patterns = saved["patterns"]
+        return watchlist
+
+    def spans(self, doc):
+        """
+        Watchlist hits in a Doc as labelled spans, longest first where they overlap.
+
+        The Doc may come from any English pipeline, not only this watchlist's tokenizer.
+        """
+        spans = [Span(doc, start, end, label=self.labels[match_id]) for match_id, start, end in self.matcher(doc)]
+        return filter_spans(spans)
+
+    def merge(self, doc):
+        """Combine watchlist hits with the Doc's statistical entities; watchlist spans win exact ties."""
+        return filter_spans(self.spans(doc) + list(doc.ents))
+
+    def extract(self, texts, batch_size=1000):
+        """
+        Tokenize texts (nothing else) and yield the (text, label) watchlist hits of each one.
+        """
+        for doc in self.nlp.tokenizer.pipe(texts, batch_size=batch_size):
+            yield [(span.text, span.label_) for span in self.spans(doc)]